@@ -1,16 +1,26 @@
-import json
 import os
-import tempfile
-import uuid
 from html import escape
-from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import List, Tuple
 
 import gradio as gr
 
 from generate_topic import generate_subtopics as build_subtopics
+from generate_topic import set_upstream_gate
 from generate_translation import generate_translations_stream
+from fair_scheduler import FairScheduler, scheduling_context
+from job_manager import FINISHED_STATES, JOB_CANCELLED, JOB_FAILED, Job, JobManager
+from output_io import append_output_jsonl_items, create_output_jsonl_path
+from tracing import traced
 
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+UPSTREAM_CONCURRENCY = int(os.getenv("HAPPY_API_MAX_CONCURRENCY", "8"))
+JOB_POLL_SECONDS = 1.0
+SMALL_JOB_PAIRS = 50
+DISPLAY_WINDOW = int(os.getenv("TRANSLATION_DISPLAY_WINDOW", "200"))
+
+JOBS = JobManager(max_workers=JOB_WORKERS, display_window=DISPLAY_WINDOW)
+SCHEDULER = FairScheduler(UPSTREAM_CONCURRENCY)
+set_upstream_gate(SCHEDULER.slot)
 
 
 def get_api_token(user_token: str) -> str:
@@ -22,57 +32,143 @@ def get_api_token(user_token: str) -> str:
     raise gr.Error("未找到环境变量 HAPPY_API_TOKEN，请在页面填写。")
 
 
+def get_session_id(request: gr.Request | None) -> str | None:
+    if request is None:
+        return None
+    return getattr(request, "session_hash", None)
+
+
+def count_requested_pairs(topic_rows: List[List[str]]) -> int:
+    total = 0
+    for row in topic_rows or []:
+        try:
+            total += max(int(float(row[1])), 0)
+        except (IndexError, ValueError, TypeError):
+            continue
+    return total
+
+
 def handle_generate_subtopics(
-    topic: str, subtopic_count: int, default_translation_count: int, user_token: str
+    topic: str,
+    subtopic_count: int,
+    default_translation_count: int,
+    user_token: str,
+    request: gr.Request = None,
 ) -> Tuple[List[List[str]], List[List[str]], None, str]:
     token = get_api_token(user_token)
     try:
-        rows = build_subtopics(topic, int(subtopic_count), int(default_translation_count), token)
+        with scheduling_context(get_session_id(request), interactive=True):
+            rows = build_subtopics(
+                topic, int(subtopic_count), int(default_translation_count), token
+            )
     except ValueError as exc:
         raise gr.Error(str(exc))
     return rows, render_translation_table([]), None, "翻译总数：0"
 
 
+@traced()
+def run_translation_job(
+    job: Job,
+    topic_rows: List[List[str]],
+    token: str,
+    translation_length: int,
+    interactive: bool,
+) -> str:
+    output_path = create_output_jsonl_path()
+    params = {"length": translation_length, "source": "app"}
+    with scheduling_context(job.session, interactive):
+        for current, total, items in generate_translations_stream(
+            topic_rows, token, translation_length
+        ):
+            if items:
+                subtopic = str(topic_rows[current - 1][0]).strip()
+                append_output_jsonl_items(output_path, items, subtopic, params)
+            job.update(current, total, items)
+    if not job.total_items:
+        raise ValueError("没有生成任何翻译，请检查数量设置后重试。")
+    return output_path
+
+
+def follow_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise gr.Error("找不到该任务，可能已过期，请重新生成。")
+    version = -1
+    position = 0
+    while True:
+        latest = job.wait_for_update(version, JOB_POLL_SECONDS)
+        latest_position = SCHEDULER.position(job.session)
+        if (
+            latest == version
+            and latest_position == position
+            and job.status not in FINISHED_STATES
+        ):
+            continue
+        version = latest
+        position = latest_position
+        snapshot = job.snapshot()
+        if snapshot["status"] == JOB_FAILED:
+            raise gr.Error(snapshot["error"] or "任务失败。")
+        if snapshot["status"] == JOB_CANCELLED:
+            raise gr.Error("任务已取消。")
+        table_rows = [[t["chinese"], t["uyghur"]] for t in snapshot["translations"]]
+        total_text = render_total(snapshot["total_items"], len(table_rows))
+        progress_html = render_progress(snapshot["current"], snapshot["total"], position)
+        yield (
+            render_translation_table(table_rows),
+            snapshot["result_path"],
+            total_text,
+            progress_html,
+            job.id,
+        )
+        if snapshot["status"] in FINISHED_STATES:
+            return
+
+
 def handle_generate_translations(
     topic_rows: List[List[str]],
     user_token: str,
     translation_length: int,
+    request: gr.Request = None,
 ):
     token = get_api_token(user_token)
     total_rows = len(topic_rows or [])
-    progress_html = render_progress(0, total_rows)
-    yield render_translation_table([]), None, "翻译总数：0", progress_html
-    try:
-        translations: List[Dict[str, str]] = []
-        output_path = create_output_jsonl_path()
-        for current, total, items in generate_translations_stream(
-            topic_rows, token, int(translation_length)
-        ):
-            if items:
-                translations.extend(items)
-                append_output_jsonl_items(output_path, items)
-            progress_html = render_progress(current, total)
-            table_rows = [[t["chinese"], t["uyghur"]] for t in translations]
-            total_text = f"翻译总数：{len(translations)}"
-            yield render_translation_table(table_rows), None, total_text, progress_html
-    except ValueError as exc:
-        raise gr.Error(str(exc))
+    interactive = count_requested_pairs(topic_rows) <= SMALL_JOB_PAIRS
+    job = JOBS.submit(
+        run_translation_job,
+        topic_rows,
+        token,
+        int(translation_length),
+        interactive,
+        session=get_session_id(request),
+    )
+    yield render_translation_table([]), None, "翻译总数：0", render_progress(0, total_rows), job.id
+    yield from follow_job(job.id)
+
+
+def handle_resume_job(job_id: str):
+    yield from follow_job(job_id)
 
-    if not translations:
-        raise gr.Error("没有生成任何翻译，请检查数量设置后重试。")
 
-    table_rows = [[t["chinese"], t["uyghur"]] for t in translations]
-    jsonl_path = write_jsonl(translations)
-    total = f"翻译总数：{len(translations)}"
-    yield render_translation_table(table_rows), jsonl_path, total, render_progress(total_rows, total_rows)
+def handle_cancel_job(job_id: str) -> str:
+    if JOBS.cancel(job_id):
+        return "已请求取消任务。"
+    return "任务不存在或已结束。"
 
 
-def render_progress(current: int, total: int) -> str:
+def render_total(total_items: int, shown: int) -> str:
+    if shown < total_items:
+        return f"翻译总数：{total_items}（仅显示最近 {shown} 条，完整结果请下载）"
+    return f"翻译总数：{total_items}"
+
+
+def render_progress(current: int, total: int, queue_position: int = 0) -> str:
     safe_total = max(total, 1)
     percent = int((current / safe_total) * 100)
+    queue_text = f"，排队中：第 {queue_position} 位" if queue_position else ""
     return f"""
 <div class="progress-shell">
-  <div class="progress-meta">已处理 {current}/{total}</div>
+  <div class="progress-meta">已处理 {current}/{total}{queue_text}</div>
   <div class="progress-track">
     <div class="progress-fill" style="width: {percent}%"></div>
   </div>
@@ -80,54 +176,7 @@ def render_progress(current: int, total: int) -> str:
 """
 
 
-def write_jsonl(translations: List[Dict[str, str]]) -> str:
-    fd, path = tempfile.mkstemp(prefix="uyghur_translations_", suffix=".jsonl")
-    with os.fdopen(fd, "w", encoding="utf-8") as f:
-        for item in translations:
-            line = json.dumps(
-                {"chinese": item["chinese"], "uyghur": item["uyghur"]},
-                ensure_ascii=False,
-            )
-            f.write(line + "\n")
-    return path
-
-
-def write_output_jsonl(translations: List[Dict[str, str]]) -> str:
-    out_dir = os.path.join(os.getcwd(), "out")
-    os.makedirs(out_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-    filename = f"uyghur_translations_{timestamp}_{uuid.uuid4().hex}.jsonl"
-    path = os.path.join(out_dir, filename)
-    with open(path, "w", encoding="utf-8") as f:
-        for item in translations:
-            line = json.dumps(
-                {"chinese": item["chinese"], "uyghur": item["uyghur"]},
-                ensure_ascii=False,
-            )
-            f.write(line + "\n")
-    return path
-
-
-def create_output_jsonl_path() -> str:
-    out_dir = os.path.join(os.getcwd(), "out")
-    os.makedirs(out_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-    filename = f"uyghur_translations_{timestamp}_{uuid.uuid4().hex}.jsonl"
-    return os.path.join(out_dir, filename)
-
-
-def append_output_jsonl_items(path: str, items: List[Dict[str, str]]) -> None:
-    if not items:
-        return
-    with open(path, "a", encoding="utf-8") as f:
-        for item in items:
-            line = json.dumps(
-                {"chinese": item["chinese"], "uyghur": item["uyghur"]},
-                ensure_ascii=False,
-            )
-            f.write(line + "\n")
-
-
+@traced()
 def render_translation_table(rows: List[List[str]]) -> str:
     header = (
         "<table class=\"translation-table\">"
@@ -183,6 +232,15 @@ with gr.Blocks(
             gen_subtopics_btn = gr.Button("生成子话题", variant="primary")
             gen_translations_btn = gr.Button("生成翻译数据", variant="secondary")
             total_text = gr.Markdown("翻译总数：0")
+            job_id_box = gr.Textbox(
+                label="任务 ID（断线后可恢复）",
+                placeholder="生成翻译后自动填写",
+                elem_id="job-id",
+            )
+            with gr.Row():
+                resume_job_btn = gr.Button("恢复任务")
+                cancel_job_btn = gr.Button("取消任务", variant="stop")
+            job_status_text = gr.Markdown("")
 
     subtopic_table = gr.Dataframe(
         headers=["子话题", "数量"],
@@ -206,13 +264,45 @@ with gr.Blocks(
     gen_translations_btn.click(
         handle_generate_translations,
         inputs=[subtopic_table, api_token, translation_length],
-        outputs=[translation_table, download_file, total_text, progress_bar],
+        outputs=[translation_table, download_file, total_text, progress_bar, job_id_box],
+        show_progress="full",
+        concurrency_limit=None,
+    )
+
+    resume_job_btn.click(
+        handle_resume_job,
+        inputs=[job_id_box],
+        outputs=[translation_table, download_file, total_text, progress_bar, job_id_box],
         show_progress="full",
+        concurrency_limit=None,
+    )
+
+    cancel_job_btn.click(
+        handle_cancel_job,
+        inputs=[job_id_box],
+        outputs=[job_status_text],
     )
 
 js = """
 (function () {
   const STORAGE_KEY = "happy_api_token";
+  const JOB_STORAGE_KEY = "translation_job_id";
+
+  function watchJobId() {
+    const root = document.getElementById("job-id");
+    const input = root && root.querySelector("input, textarea");
+    if (!input) return false;
+    const stored = localStorage.getItem(JOB_STORAGE_KEY);
+    if (stored && !input.value) {
+      input.value = stored;
+      input.dispatchEvent(new Event("input", { bubbles: true }));
+    }
+    setInterval(() => {
+      const value = (input.value || "").trim();
+      if (value) localStorage.setItem(JOB_STORAGE_KEY, value);
+    }, 1000);
+    return true;
+  }
 
   function findTokenInput() {
     const root = document.getElementById("happy-api-token");
@@ -240,10 +330,14 @@ js = """
     return true;
   }
 
-  if (hydrate()) return;
+  let tokenReady = hydrate();
+  let jobReady = watchJobId();
+  if (tokenReady && jobReady) return;
 
   const observer = new MutationObserver(() => {
-    if (hydrate()) {
+    tokenReady = tokenReady || hydrate();
+    jobReady = jobReady || watchJobId();
+    if (tokenReady && jobReady) {
       observer.disconnect();
     }
   });
@@ -327,10 +421,12 @@ css="""
 """
 
 demo.queue(default_concurrency_limit=4)
-demo.launch(
-    css=css,
-    js=js,
-    theme=gr.themes.Ocean(),
-    # server_name="0.0.0.0", 
-    # server_port=80
-    )
+
+if __name__ == "__main__":
+    demo.launch(
+        css=css,
+        js=js,
+        theme=gr.themes.Ocean(),
+        # server_name="0.0.0.0", 
+        # server_port=80
+        )
@@ -0,0 +1,241 @@
+import asyncio
+import contextvars
+import functools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+from generate_topic import (
+    HAPPY_API_HOST,
+    MODEL,
+    UpstreamCall,
+    completion_endpoint,
+    parse_sse_line,
+    prepare_subtopic_prompt,
+    subtopic_rows_from_response,
+    upstream_gate,
+)
+from generate_translation import (
+    ADAPTIVE_COUNT,
+    QUALITY_FILTER,
+    RESPONSE_FORMAT,
+    build_translation_prompt,
+    finish_translation_batch,
+    parse_topic_row,
+    plan_subtopic_requests,
+    validate_translation_request,
+)
+from quality_filter import QualityFilter
+from tracing import span
+
+MAX_CONCURRENT_STREAMS = 256
+ROW_WINDOW = 8
+
+_STATE_IO = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state-io")
+
+
+def _import_httpx() -> Any:
+    try:
+        import httpx
+    except ImportError as exc:
+        raise RuntimeError("异步接口需要 httpx，请先安装: pip install httpx") from exc
+    return httpx
+
+
+async def _off_loop(fn: Callable[..., Any], *args: Any) -> Any:
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_STATE_IO, functools.partial(context.run, fn, *args))
+
+
+@asynccontextmanager
+async def _gated() -> AsyncIterator[None]:
+    gate = upstream_gate()
+    entering = asyncio.ensure_future(asyncio.to_thread(gate.__enter__))
+    try:
+        await asyncio.shield(entering)
+    except asyncio.CancelledError:
+        entering.add_done_callback(lambda _: gate.__exit__(None, None, None))
+        raise
+    try:
+        yield
+    finally:
+        gate.__exit__(None, None, None)
+
+
+class AsyncPipeline:
+    def __init__(
+        self,
+        token: str,
+        host: str = HAPPY_API_HOST,
+        max_concurrency: int = MAX_CONCURRENT_STREAMS,
+        timeout: float = 300.0,
+    ) -> None:
+        httpx = _import_httpx()
+        self._httpx = httpx
+        self.token = token
+        self.host = host
+        self.max_concurrency = max(max_concurrency, 1)
+        self._streams = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=30.0),
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+        )
+
+    async def __aenter__(self) -> "AsyncPipeline":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _read_completion_stream(
+        self, url: str, headers: Dict[str, str], payload: Dict[str, Any], capture: Any
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        out_parts: List[str] = []
+        usage: Optional[Dict[str, Any]] = None
+        async with self._client.stream("POST", url, headers=headers, json=payload) as r:
+            if capture is not None:
+                capture.response(r.status_code)
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if capture is not None and line:
+                    capture.line(line)
+                content, done, chunk_usage = parse_sse_line(line)
+                if done:
+                    break
+                if chunk_usage:
+                    usage = chunk_usage
+                if content:
+                    out_parts.append(content)
+        return "".join(out_parts), usage
+
+    async def stream_chat_completion_with_model(self, instruction: str, model: str = MODEL) -> Tuple[str, str]:
+        url, headers = completion_endpoint(self.host, self.token)
+        call = UpstreamCall(instruction, model)
+        for attempt in call.attempts():
+            try:
+                async with self._streams, _gated():
+                    with span("upstream_attempt", "http", model=attempt.candidate, mode="async") as attempt_span:
+                        attempt.start()
+                        try:
+                            text, usage = await self._read_completion_stream(
+                                url, headers, attempt.payload, attempt.capture
+                            )
+                            await _off_loop(attempt.succeeded, text, usage)
+                            return text, attempt.candidate
+                        except self._httpx.HTTPError as exc:
+                            attempt_span.set(error=type(exc).__name__)
+                            await _off_loop(attempt.failed, exc)
+            finally:
+                attempt.close()
+        return call.exhausted()
+
+    async def stream_chat_completion(self, instruction: str, model: str = MODEL) -> str:
+        text, _ = await self.stream_chat_completion_with_model(instruction, model)
+        return text
+
+    async def generate_subtopics(
+        self, topic: str, subtopic_count: int, default_translation_count: int
+    ) -> List[List[Any]]:
+        prompt = prepare_subtopic_prompt(topic, subtopic_count)
+        response = await self.stream_chat_completion(prompt)
+        return subtopic_rows_from_response(response, default_translation_count)
+
+    async def iter_subtopics(
+        self, topics: List[str], subtopic_count: int, default_translation_count: int, window: int = ROW_WINDOW
+    ) -> AsyncIterator[Tuple[str, List[List[Any]] | Exception]]:
+        async def one(topic: str) -> List[List[Any]] | Exception:
+            try:
+                return await self.generate_subtopics(topic, subtopic_count, default_translation_count)
+            except Exception as exc:
+                return exc
+
+        async for index, result in _ordered_window([lambda t=t: one(t) for t in topics], window):
+            yield topics[index], result
+
+    async def request_translation_batch(
+        self,
+        subtopic: str,
+        count: int,
+        length: int,
+        response_format: str = RESPONSE_FORMAT,
+        quality_filter: Optional[QualityFilter] = QUALITY_FILTER,
+    ) -> Tuple[List[Dict[str, str]], int]:
+        prompt = build_translation_prompt(subtopic, count, length, response_format)
+        started = time.monotonic()
+        response, served_by = await self.stream_chat_completion_with_model(prompt)
+        return await _off_loop(
+            finish_translation_batch,
+            response,
+            served_by,
+            count,
+            length,
+            response_format,
+            time.monotonic() - started,
+            quality_filter,
+        )
+
+    async def generate_subtopic_translations(
+        self,
+        subtopic: str,
+        count: int,
+        length: int,
+        response_format: str = RESPONSE_FORMAT,
+        adaptive: bool = ADAPTIVE_COUNT,
+        quality_filter: Optional[QualityFilter] = QUALITY_FILTER,
+    ) -> List[Dict[str, str]]:
+        plan = plan_subtopic_requests(count, length, adaptive)
+        try:
+            request_size = next(plan)
+            while True:
+                request_size = plan.send(
+                    await self.request_translation_batch(subtopic, request_size, length, response_format, quality_filter)
+                )
+        except StopIteration as finished:
+            return finished.value
+
+    async def generate_translations_stream(
+        self,
+        topic_rows: List[List[Any]],
+        length: int,
+        response_format: str = RESPONSE_FORMAT,
+        adaptive: bool = ADAPTIVE_COUNT,
+        quality_filter: Optional[QualityFilter] = QUALITY_FILTER,
+        window: int = ROW_WINDOW,
+    ) -> AsyncIterator[Tuple[int, int, List[Dict[str, str]]]]:
+        validate_translation_request(topic_rows, length, response_format)
+        total_rows = len(topic_rows)
+        yield 0, total_rows, []
+
+        async def one(row: List[Any]) -> List[Dict[str, str]]:
+            subtopic, count = parse_topic_row(row)
+            if not subtopic or count <= 0:
+                return []
+            return await self.generate_subtopic_translations(
+                subtopic, count, length, response_format, adaptive, quality_filter
+            )
+
+        async for index, items in _ordered_window([lambda r=r: one(r) for r in topic_rows], window):
+            yield index + 1, total_rows, items
+
+
+async def _ordered_window(factories: List[Any], window: int) -> AsyncIterator[Tuple[int, Any]]:
+    pending: Deque[Tuple[int, asyncio.Task]] = deque()
+    next_index = 0
+    try:
+        while pending or next_index < len(factories):
+            while next_index < len(factories) and len(pending) < max(window, 1):
+                pending.append((next_index, asyncio.ensure_future(factories[next_index]())))
+                next_index += 1
+            index, task = pending.popleft()
+            yield index, await task
+    finally:
+        for _, task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List
+
+os.environ.setdefault("MODEL_STATS_PATH", "")
+os.environ.setdefault("COUNT_STATS_PATH", "")
+os.environ.setdefault("USAGE_PATH", "")
+
+from generate_topic import MODEL, stream_chat_completion_with_model
+from generate_translation import (
+    RESPONSE_FORMATS,
+    build_translation_prompt,
+    parse_translation_response,
+    validate_translation_response,
+)
+from mock_backend import start_mock_server
+from usage_ledger import estimate_tokens
+
+
+def bench_format(
+    host: str, response_format: str, count: int, length: int, requests_per_format: int
+) -> Dict[str, Any]:
+    pairs = 0
+    output_tokens = 0
+    invalid = 0
+    parse_seconds = 0.0
+    started = time.monotonic()
+    for index in range(requests_per_format):
+        prompt = build_translation_prompt(f"基准测试子话题{index}", count, length, response_format)
+        response, _ = stream_chat_completion_with_model(prompt, "mock-token", host, MODEL)
+        parse_started = time.perf_counter()
+        items = parse_translation_response(response, response_format)
+        parse_seconds += time.perf_counter() - parse_started
+        if validate_translation_response(response, response_format):
+            invalid += 1
+        pairs += len(items)
+        output_tokens += estimate_tokens(response)
+    elapsed = time.monotonic() - started
+    return {
+        "format": response_format,
+        "pairs": pairs,
+        "output_tokens": output_tokens,
+        "seconds": round(elapsed, 3),
+        "pairs_per_second": round(pairs / elapsed, 3) if elapsed else 0.0,
+        "pairs_per_1k_output_tokens": round(pairs * 1000 / output_tokens, 3) if output_tokens else 0.0,
+        "parse_us_per_pair": round(parse_seconds * 1e6 / pairs, 2) if pairs else 0.0,
+        "invalid_responses": invalid,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="对比不同返回格式的每秒条数和每输出 token 条数")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--length", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--format", action="append", choices=list(RESPONSE_FORMATS))
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+
+    server, host = start_mock_server(tokens_per_second=args.tokens_per_second)
+    results: List[Dict[str, Any]] = []
+    try:
+        for response_format in args.format or list(RESPONSE_FORMATS):
+            results.append(
+                bench_format(host, response_format, args.count, args.length, args.requests)
+            )
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    print(f"{'格式':<8}{'条数':>8}{'输出token':>12}{'条/秒':>10}{'条/千token':>12}{'解析μs/条':>12}{'无效':>6}")
+    for row in results:
+        print(
+            f"{row['format']:<8}{row['pairs']:>8}{row['output_tokens']:>12}"
+            f"{row['pairs_per_second']:>10}{row['pairs_per_1k_output_tokens']:>12}"
+            f"{row['parse_us_per_pair']:>12}{row['invalid_responses']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+DEFAULT_TARGETS = (
+    "pass",
+    "import generate_translation",
+    "import run_locally_multiple_topic",
+    "import run_target_corpus",
+    "import coordinator",
+    "import cli",
+)
+APP_TARGET = "import app"
+
+
+def bench_target(code: str, repeats: int) -> Dict[str, Any]:
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples: List[float] = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=here, capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0:
+            return {"target": code, "error": (result.stderr.strip().splitlines() or ["失败"])[-1]}
+        samples.append(elapsed * 1000)
+    return {
+        "target": code,
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="测量各入口在新进程中的启动耗时")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--target", action="append", help="要执行的 Python 代码，可重复，默认测各个入口模块")
+    parser.add_argument("--include-app", action="store_true", help="同时测量导入 Gradio 应用")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args()
+
+    targets = list(args.target or DEFAULT_TARGETS)
+    if args.include_app:
+        targets.append(APP_TARGET)
+    results = [bench_target(code, max(args.repeats, 1)) for code in targets]
+    baseline = next((r["median_ms"] for r in results if r["target"] == "pass" and "median_ms" in r), 0.0)
+    for row in results:
+        if "median_ms" in row:
+            row["over_baseline_ms"] = round(row["median_ms"] - baseline, 1)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    print(f"{'入口':<40}{'中位ms':>10}{'最小ms':>10}{'额外ms':>10}")
+    for row in results:
+        if "error" in row:
+            print(f"{row['target']:<40}  失败: {row['error']}")
+            continue
+        print(f"{row['target']:<40}{row['median_ms']:>10}{row['min_ms']:>10}{row['over_baseline_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
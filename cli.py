@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import sys
+from typing import Any, List
+
+from tracing import add_trace_arguments, configure_from_args
+
+
+def resolve_token(token: str | None) -> str:
+    token = os.getenv("HAPPY_API_TOKEN") or token
+    if token and token.strip():
+        return token.strip()
+    raise SystemExit("未找到环境变量 HAPPY_API_TOKEN，请使用 --token 指定。")
+
+
+def load_rows(path: str) -> List[List[Any]]:
+    if path == "-":
+        data = json.load(sys.stdin)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    if not isinstance(data, list):
+        raise SystemExit("子话题文件必须是 [[子话题, 数量], ...] 格式的 JSON。")
+    return data
+
+
+def cmd_subtopics(args: argparse.Namespace) -> None:
+    from generate_topic import generate_subtopics
+
+    rows = generate_subtopics(args.topic, args.count, args.translation_count, resolve_token(args.token))
+    text = json.dumps(rows, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"已保存: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+def cmd_translations(args: argparse.Namespace) -> None:
+    from generate_translation import generate_translations_stream
+    from output_io import append_output_jsonl_items, create_output_jsonl_path
+
+    if args.rows:
+        rows = load_rows(args.rows)
+    elif args.subtopic:
+        rows = [[subtopic, args.count] for subtopic in args.subtopic]
+    else:
+        raise SystemExit("请使用 --rows 或 --subtopic 指定子话题。")
+    token = resolve_token(args.token)
+    path = args.output or create_output_jsonl_path(args.output_dir)
+    params = {"length": args.length, "source": "cli"}
+    total_items = 0
+    for current, total, items in generate_translations_stream(rows, token, args.length):
+        if items:
+            append_output_jsonl_items(path, items, str(rows[current - 1][0]).strip(), params)
+            total_items += len(items)
+        print(f"已处理 {current}/{total}，翻译 {total_items} 条", file=sys.stderr)
+    print(path)
+
+
+def cmd_topics(args: argparse.Namespace) -> None:
+    import run_locally_multiple_topic as runner
+
+    runner.TOPICS_PATH = args.topics
+    runner.OUTPUT_DIR = args.output_dir
+    runner.PROGRESS_PATH = os.path.join(args.output_dir, "progress_topic.json")
+    runner.DONE_PATH = os.path.join(args.output_dir, "progress_done.txt")
+    if args.range:
+        os.environ["TOPIC_RANGE"] = args.range
+    if args.token:
+        os.environ.setdefault("HAPPY_API_TOKEN", args.token)
+    runner.main()
+
+
+def cmd_merge(args: argparse.Namespace) -> None:
+    from merge_jsonl import merge_jsonl_files
+
+    merge_jsonl_files(args.input_dir, args.output)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="无界面生成中文↔维吾尔语翻译数据")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("subtopics", help="根据大主题生成子话题")
+    p.add_argument("topic")
+    p.add_argument("--count", type=int, default=5, help="子话题数量（最多 50）")
+    p.add_argument("--translation-count", type=int, default=5, help="每个子话题的翻译数量")
+    p.add_argument("--output", help="保存为 JSON 文件，默认输出到标准输出")
+    p.set_defaults(func=cmd_subtopics)
+
+    p = sub.add_parser("translations", help="为子话题生成翻译并写入 JSONL")
+    p.add_argument("--rows", help="subtopics 命令输出的 JSON 文件，- 表示标准输入")
+    p.add_argument("--subtopic", action="append", help="子话题，可重复")
+    p.add_argument("--count", type=int, default=5, help="--subtopic 的翻译数量")
+    p.add_argument("--length", type=int, default=40)
+    p.add_argument("--output", help="输出 JSONL 路径，默认在 --output-dir 下新建")
+    p.add_argument("--output-dir", default="out")
+    p.set_defaults(func=cmd_translations)
+
+    p = sub.add_parser("topics", help="按主题文件批量生成（同 run_locally_multiple_topic.py）")
+    p.add_argument("--topics", default="topics.txt")
+    p.add_argument("--range", help="只处理该范围内的主题，如 0:1000")
+    p.add_argument("--output-dir", default="multiple_out")
+    p.set_defaults(func=cmd_topics)
+
+    p = sub.add_parser("merge", help="合并目录下的 JSONL 文件")
+    p.add_argument("--input-dir", default="out")
+    p.add_argument("--output", default="merged_uyghur_translations.jsonl")
+    p.set_defaults(func=cmd_merge)
+
+    for name in ("subtopics", "translations", "topics"):
+        sub.choices[name].add_argument("--token", help="默认读取环境变量 HAPPY_API_TOKEN")
+    for p in sub.choices.values():
+        add_trace_arguments(p)
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    configure_from_args(args)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
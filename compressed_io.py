@@ -0,0 +1,153 @@
+import gzip
+import os
+import zlib
+from typing import Any, Iterator, List, Optional, Tuple
+
+OUTPUT_COMPRESSION = os.getenv("OUTPUT_COMPRESSION", "").strip().lower()
+COMPRESSION_LEVEL = int(os.getenv("OUTPUT_COMPRESSION_LEVEL", "0"))
+CODEC_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+JSONL_SUFFIXES = (".jsonl", ".jsonl.gz", ".jsonl.zst")
+READ_BLOCK_BYTES = 1 << 16
+SINK_CHUNK_LINES = 4096
+
+
+def _import_zstd() -> Any:
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError("zstd 压缩需要 zstandard，请先安装: pip install zstandard") from exc
+    return zstandard
+
+
+def codec_for_path(path: str) -> Optional[str]:
+    for codec, suffix in CODEC_SUFFIXES.items():
+        if path.endswith(suffix):
+            return codec
+    return None
+
+
+def output_path(path: str, codec: Optional[str] = None) -> str:
+    codec = OUTPUT_COMPRESSION if codec is None else codec
+    if not codec or codec_for_path(path):
+        return path
+    if codec not in CODEC_SUFFIXES:
+        raise ValueError(f"不支持的压缩格式: {codec}（可选 gzip、zstd）")
+    return path + CODEC_SUFFIXES[codec]
+
+
+def is_jsonl_path(path: str) -> bool:
+    return path.endswith(JSONL_SUFFIXES)
+
+
+def compress_chunk(data: bytes, codec: str) -> bytes:
+    level = COMPRESSION_LEVEL or DEFAULT_LEVELS[codec]
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return _import_zstd().ZstdCompressor(level=level).compress(data)
+
+
+def decompress_chunk(data: bytes, codec: str) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    return _import_zstd().ZstdDecompressor().decompressobj().decompress(data)
+
+
+def _decompressor(codec: str) -> Any:
+    if codec == "gzip":
+        return zlib.decompressobj(wbits=31)
+    return _import_zstd().ZstdDecompressor().decompressobj()
+
+
+def _split_lines(data: bytes) -> List[bytes]:
+    lines = data.split(b"\n")
+    return [line + b"\n" for line in lines[:-1]]
+
+
+def iter_chunks(path: str, start: int = 0, include_partial: bool = False) -> Iterator[Tuple[List[bytes], int]]:
+    codec = codec_for_path(path)
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start
+        if codec is None:
+            pending = b""
+            while True:
+                block = f.read(READ_BLOCK_BYTES)
+                if not block:
+                    if include_partial and pending.strip():
+                        yield [pending + b"\n"], position + len(pending)
+                    return
+                pending += block
+                cut = pending.rfind(b"\n") + 1
+                if cut:
+                    position += cut
+                    yield _split_lines(pending[:cut]), position
+                    pending = pending[cut:]
+        decoder = _decompressor(codec)
+        pending = b""
+        consumed = 0
+        data = f.read(READ_BLOCK_BYTES)
+        while data:
+            try:
+                pending += decoder.decompress(data)
+            except (zlib.error, OSError, ValueError):
+                return
+            if not decoder.eof:
+                cut = pending.rfind(b"\n") + 1
+                if cut:
+                    yield _split_lines(pending[:cut]), position
+                    pending = pending[cut:]
+                consumed += len(data)
+                data = f.read(READ_BLOCK_BYTES)
+                continue
+            leftover = decoder.unused_data
+            position += consumed + len(data) - len(leftover)
+            if pending and not pending.endswith(b"\n"):
+                pending += b"\n"
+            yield _split_lines(pending), position
+            decoder = _decompressor(codec)
+            pending = b""
+            consumed = 0
+            data = leftover or f.read(READ_BLOCK_BYTES)
+
+
+def iter_lines(path: str, start: int = 0, include_partial: bool = False) -> Iterator[bytes]:
+    for lines, _ in iter_chunks(path, start, include_partial):
+        yield from lines
+
+
+class JsonlSink:
+    def __init__(self, path: str, mode: str = "w", chunk_lines: int = SINK_CHUNK_LINES) -> None:
+        self.path = path
+        self.codec = codec_for_path(path)
+        self.chunk_lines = max(chunk_lines, 1)
+        self._buffer: List[bytes] = []
+        self._file = open(path, mode + "b")
+
+    def __enter__(self) -> "JsonlSink":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def write_line(self, line: bytes) -> None:
+        if not line.endswith(b"\n"):
+            line += b"\n"
+        self._buffer.append(line)
+        if len(self._buffer) >= self.chunk_lines:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        data = b"".join(self._buffer)
+        self._buffer = []
+        self._file.write(compress_chunk(data, self.codec) if self.codec else data)
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
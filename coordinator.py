@@ -0,0 +1,463 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+import requests
+
+from corpus_manifest import get_manifest
+from topic_source import TopicSource, load_done_ids, mark_done, parse_topic_range
+from usage_ledger import usage_scope
+
+TOPICS_PATH = "topics.txt"
+DONE_PATH = os.path.join("coordinator", "progress_done.txt")
+FAILED_PATH = os.path.join("coordinator", "failed.txt")
+LEASE_SECONDS = 300.0
+MAX_ATTEMPTS = 3
+LEASE_BATCH = 256
+COMPLETED_MEMORY = 4096
+REQUEST_RETRIES = 5
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+
+
+class Lease:
+    def __init__(self, position: int, topic_id: str, topic: str, worker: str, seconds: float, attempt: int) -> None:
+        self.lease_id = uuid.uuid4().hex
+        self.position = position
+        self.topic_id = topic_id
+        self.topic = topic
+        self.worker = worker
+        self.seconds = seconds
+        self.attempt = attempt
+        self.issued = time.monotonic()
+        self.expires = self.issued + seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lease_id": self.lease_id,
+            "position": self.position,
+            "topic_id": self.topic_id,
+            "topic": self.topic,
+            "attempt": self.attempt,
+            "lease_seconds": self.seconds,
+        }
+
+
+class Coordinator:
+    def __init__(
+        self,
+        source: TopicSource,
+        done_path: str = DONE_PATH,
+        failed_path: str = FAILED_PATH,
+        topic_range: Tuple[int, int] | None = None,
+        lease_seconds: float = LEASE_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS,
+    ) -> None:
+        self.source = source
+        self.done_path = done_path
+        self.failed_path = failed_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.start, self.stop = topic_range or (0, len(source))
+        self._cursor = self.start
+        self._lock = threading.Lock()
+        self._done: Set[str] = load_done_ids(done_path)
+        self._failed: Set[str] = load_done_ids(failed_path)
+        self._retry: Deque[Tuple[int, str, str, int]] = deque()
+        self._buffer: Deque[Tuple[int, str, str]] = deque()
+        self._leases: Dict[str, Lease] = {}
+        self._leased_ids: Set[str] = set()
+        self._completed: "OrderedDict[str, str]" = OrderedDict()
+        self._workers: Dict[str, Dict[str, Any]] = {}
+        self._reissued = 0
+        self._started = time.monotonic()
+
+    def _worker(self, name: str) -> Dict[str, Any]:
+        worker = self._workers.get(name)
+        if worker is None:
+            worker = {"joined": time.time(), "completed": 0, "failed": 0, "expired": 0, "pairs": 0, "busy_seconds": 0.0}
+            self._workers[name] = worker
+        worker["last_seen"] = time.time()
+        return worker
+
+    def _reap(self) -> None:
+        now = time.monotonic()
+        for lease_id, lease in list(self._leases.items()):
+            if lease.expires > now:
+                continue
+            del self._leases[lease_id]
+            self._leased_ids.discard(lease.topic_id)
+            self._worker(lease.worker)["expired"] += 1
+            self._requeue(lease)
+            self._reissued += 1
+
+    def _requeue(self, lease: Lease) -> None:
+        if lease.attempt >= self.max_attempts:
+            self._failed.add(lease.topic_id)
+            mark_done(self.failed_path, lease.topic_id)
+            return
+        self._retry.append((lease.position, lease.topic_id, lease.topic, lease.attempt))
+
+    def _next_topic(self) -> Optional[Tuple[int, str, str, int]]:
+        if self._retry:
+            return self._retry.popleft()
+        while True:
+            if not self._buffer:
+                if self._cursor >= self.stop:
+                    return None
+                batch_stop = min(self._cursor + LEASE_BATCH, self.stop)
+                self._buffer.extend(
+                    (r.position, r.topic_id, r.topic) for r in self.source.iter_range(self._cursor, batch_stop)
+                )
+                self._cursor = batch_stop
+                continue
+            position, topic_id, topic = self._buffer.popleft()
+            if topic_id in self._done or topic_id in self._failed or topic_id in self._leased_ids:
+                continue
+            return position, topic_id, topic, 0
+
+    def lease(self, worker: str) -> Dict[str, Any]:
+        with self._lock:
+            self._reap()
+            self._worker(worker)
+            picked = self._next_topic()
+            if picked is None:
+                return {"lease": None, "finished": not self._leases}
+            position, topic_id, topic, attempt = picked
+            lease = Lease(position, topic_id, topic, worker, self.lease_seconds, attempt + 1)
+            self._leases[lease.lease_id] = lease
+            self._leased_ids.add(topic_id)
+            return {"lease": lease.to_dict()}
+
+    def heartbeat(self, worker: str, lease_id: str) -> bool:
+        with self._lock:
+            self._reap()
+            self._worker(worker)
+            lease = self._leases.get(lease_id)
+            if lease is None or lease.worker != worker:
+                return False
+            lease.expires = time.monotonic() + lease.seconds
+            return True
+
+    def complete(self, worker: str, lease_id: str, pairs: int, seconds: float) -> bool:
+        with self._lock:
+            stats = self._worker(worker)
+            if self._completed.get(lease_id) == worker:
+                return True
+            lease = self._leases.pop(lease_id, None)
+            if lease is None or lease.worker != worker:
+                return False
+            self._leased_ids.discard(lease.topic_id)
+            self._done.add(lease.topic_id)
+            mark_done(self.done_path, lease.topic_id)
+            self._completed[lease_id] = worker
+            if len(self._completed) > COMPLETED_MEMORY:
+                self._completed.popitem(last=False)
+            stats["completed"] += 1
+            stats["pairs"] += pairs
+            stats["busy_seconds"] += seconds
+            return True
+
+    def fail(self, worker: str, lease_id: str, error: str) -> bool:
+        with self._lock:
+            stats = self._worker(worker)
+            lease = self._leases.pop(lease_id, None)
+            if lease is None or lease.worker != worker:
+                return False
+            self._leased_ids.discard(lease.topic_id)
+            stats["failed"] += 1
+            stats["last_error"] = error
+            self._requeue(lease)
+            return True
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._reap()
+            workers = {}
+            now = time.time()
+            for name, stats in self._workers.items():
+                busy = stats["busy_seconds"]
+                workers[name] = {
+                    **stats,
+                    "busy_seconds": round(busy, 2),
+                    "pairs_per_second": round(stats["pairs"] / busy, 3) if busy else 0.0,
+                    "idle_seconds": round(now - stats["last_seen"], 1),
+                    "active_leases": sum(1 for lease in self._leases.values() if lease.worker == name),
+                }
+            return {
+                "range": [self.start, self.stop],
+                "done": len(self._done),
+                "failed": len(self._failed),
+                "leased": len(self._leases),
+                "retry_queue": len(self._retry),
+                "unscanned": self.stop - self._cursor + len(self._buffer),
+                "reissued": self._reissued,
+                "uptime_seconds": round(time.monotonic() - self._started, 1),
+                "total_pairs": sum(w["pairs"] for w in self._workers.values()),
+                "workers": workers,
+            }
+
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    server_version = "Coordinator/1.0"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status: int, data: Dict[str, Any]) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/status":
+            self._reply(200, self.server.coordinator.status())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            worker = str(body["worker"])
+        except (json.JSONDecodeError, KeyError, TypeError):
+            self._reply(400, {"error": "invalid request"})
+            return
+        coordinator: Coordinator = self.server.coordinator
+        path = self.path.rstrip("/")
+        if path == "/lease":
+            self._reply(200, coordinator.lease(worker))
+            return
+        lease_id = str(body.get("lease_id", ""))
+        if path == "/heartbeat":
+            ok = coordinator.heartbeat(worker, lease_id)
+        elif path == "/complete":
+            ok = coordinator.complete(worker, lease_id, int(body.get("pairs", 0)), float(body.get("seconds", 0.0)))
+        elif path == "/fail":
+            ok = coordinator.fail(worker, lease_id, str(body.get("error", "")))
+        else:
+            self._reply(404, {"error": "not found"})
+            return
+        self._reply(200 if ok else 410, {"ok": ok})
+
+
+def start_coordinator(
+    coordinator: Coordinator, host: str = "127.0.0.1", port: int = 0, verbose: bool = False
+) -> Tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer((host, port), CoordinatorHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.coordinator = coordinator
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}"
+
+
+class CoordinatorClient:
+    def __init__(self, url: str, worker: str, timeout: float = 30.0) -> None:
+        self.url = url.rstrip("/")
+        self.worker = worker
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, path: str, retries: int = REQUEST_RETRIES, **fields: Any) -> Tuple[int, Dict[str, Any]]:
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(
+                    self.url + path, json={"worker": self.worker, **fields}, timeout=self.timeout
+                )
+                if response.status_code not in (200, 410):
+                    response.raise_for_status()
+                return response.status_code, response.json()
+            except requests.RequestException as exc:
+                status = exc.response.status_code if exc.response is not None else None
+                if attempt >= retries or (status is not None and status < 500):
+                    raise
+                delay = min(RETRY_BASE_SECONDS * 2**attempt, RETRY_MAX_SECONDS)
+                print(f"[{self.worker}] 请求协调服务失败 {path}: {exc}，{delay:g} 秒后重试")
+                time.sleep(delay)
+                attempt += 1
+
+    def lease(self) -> Dict[str, Any]:
+        return self._post("/lease")[1]
+
+    def heartbeat(self, lease_id: str) -> bool:
+        return self._post("/heartbeat", retries=0, lease_id=lease_id)[0] == 200
+
+    def complete(self, lease_id: str, pairs: int, seconds: float) -> bool:
+        return self._post("/complete", lease_id=lease_id, pairs=pairs, seconds=seconds)[0] == 200
+
+    def fail(self, lease_id: str, error: str) -> bool:
+        return self._post("/fail", lease_id=lease_id, error=error)[0] == 200
+
+
+def _heartbeat_loop(client: CoordinatorClient, lease_id: str, interval: float, stop: threading.Event) -> None:
+    while not stop.wait(interval):
+        try:
+            if not client.heartbeat(lease_id):
+                print(f"[{client.worker}] 租约已失效: {lease_id}")
+                return
+        except requests.RequestException as exc:
+            print(f"[{client.worker}] 心跳失败: {exc}")
+
+
+def _report_failure(client: CoordinatorClient, lease_id: str, error: str) -> None:
+    try:
+        client.fail(lease_id, error)
+    except requests.RequestException as exc:
+        print(f"[{client.worker}] 上报失败未送达，等待租约过期: {exc}")
+
+
+def run_worker(url: str, worker: str, output_dir: str, poll_seconds: float = 5.0) -> int:
+    import run_locally_multiple_topic as runner
+
+    runner.OUTPUT_DIR = output_dir
+    token = runner.get_api_token()
+    client = CoordinatorClient(url, worker)
+    processed = 0
+    while True:
+        try:
+            reply = client.lease()
+        except requests.RequestException as exc:
+            print(f"[{worker}] 无法连接协调服务，退出: {exc}")
+            return processed
+        lease = reply.get("lease")
+        if lease is None:
+            if reply.get("finished"):
+                return processed
+            time.sleep(poll_seconds)
+            continue
+        stop = threading.Event()
+        beat = threading.Thread(
+            target=_heartbeat_loop,
+            args=(client, lease["lease_id"], max(lease["lease_seconds"] / 3, 1.0), stop),
+            daemon=True,
+        )
+        beat.start()
+        started = time.monotonic()
+        print(f"[{worker}] 处理主题 {lease['position'] + 1}: {lease['topic']}")
+        try:
+            with usage_scope(lease["topic"]):
+                path, subtopic_names, records = runner.process_topic(lease["topic_id"], lease["topic"], token)
+        except Exception as exc:
+            stop.set()
+            print(f"[{worker}] 主题处理失败: {lease['topic']}，错误: {exc}")
+            runner.SUBTOPIC_INDEX.release_topic(lease["topic"])
+            _report_failure(client, lease["lease_id"], str(exc))
+            continue
+        stop.set()
+        if not records:
+            print(f"[{worker}] 主题未生成任何记录: {lease['topic']}")
+            runner.SUBTOPIC_INDEX.release_topic(lease["topic"])
+            _report_failure(client, lease["lease_id"], "未生成任何记录")
+            continue
+        stats = get_manifest(output_dir).file_stats(path) or {}
+        try:
+            accepted = client.complete(
+                lease["lease_id"], int(stats.get("records", records)), time.monotonic() - started
+            )
+        except requests.RequestException as exc:
+            print(f"[{worker}] 提交结果失败: {exc}")
+            accepted = False
+        if accepted:
+            runner.SUBTOPIC_INDEX.commit(subtopic_names)
+            processed += 1
+        else:
+            print(f"[{worker}] 租约已被重新分配，结果未计入: {lease['topic']}")
+            runner.SUBTOPIC_INDEX.release_topic(lease["topic"])
+
+
+def default_worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="多机主题分发：协调服务与工作进程")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="启动协调服务")
+    serve.add_argument("--topics", default=TOPICS_PATH)
+    serve.add_argument("--range", help="只分发该范围内的主题，如 0:1000")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=8770)
+    serve.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS)
+    serve.add_argument("--done", default=DONE_PATH)
+
+    work = sub.add_parser("work", help="连接协调服务并处理主题")
+    work.add_argument("--url", required=True)
+    work.add_argument("--worker-id", default=default_worker_name())
+    work.add_argument("--output-dir", default="multiple_out")
+
+    local = sub.add_parser("local", help="本机启动协调服务和多个工作线程（测试用）")
+    local.add_argument("--topics", default=TOPICS_PATH)
+    local.add_argument("--range")
+    local.add_argument("--workers", type=int, default=2)
+    local.add_argument("--output-dir", default="multiple_out")
+    local.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS)
+    local.add_argument("--done", default=DONE_PATH)
+    local.add_argument("--mock", action="store_true", help="使用本地模拟接口")
+
+    status = sub.add_parser("status", help="查看协调服务状态")
+    status.add_argument("--url", required=True)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(json.dumps(requests.get(args.url.rstrip("/") + "/status", timeout=30).json(), ensure_ascii=False, indent=2))
+        return
+    if args.command == "work":
+        count = run_worker(args.url, args.worker_id, args.output_dir)
+        print(f"[{args.worker_id}] 没有剩余主题，共完成 {count} 个。")
+        return
+
+    source = TopicSource(args.topics)
+    coordinator = Coordinator(
+        source,
+        args.done,
+        os.path.join(os.path.dirname(args.done), os.path.basename(FAILED_PATH)),
+        parse_topic_range(args.range, len(source)),
+        args.lease_seconds,
+    )
+    if args.command == "serve":
+        server, url = start_coordinator(coordinator, args.host, args.port, verbose=True)
+        print(f"协调服务已启动: {url}  主题范围 {coordinator.start}:{coordinator.stop}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    if args.mock:
+        from mock_backend import start_mock_server
+
+        mock_server, host = start_mock_server()
+        os.environ["HAPPY_API_HOST"] = host
+        os.environ.setdefault("HAPPY_API_TOKEN", "mock")
+    server, url = start_coordinator(coordinator)
+    threads = [
+        threading.Thread(target=run_worker, args=(url, f"local-{i + 1}", args.output_dir, 0.5))
+        for i in range(max(args.workers, 1))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    print(json.dumps(coordinator.status(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import atexit
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from compressed_io import codec_for_path, compress_chunk, decompress_chunk
+from state_store import load_json_state, save_json_state
+from tracing import traced
+
+RECORD_FIELDS = ("chinese", "uyghur")
+MANIFEST_FILENAME = "_manifest.ndjson"
+SUMMARY_FILENAME = "_manifest_summary.json"
+SUMMARY_FLUSH_SECONDS = 1.0
+
+
+def _new_summary() -> Dict[str, Any]:
+    return {"manifest_bytes": 0, "total_records": 0, "files": {}, "topics": {}, "models": {}}
+
+
+def _add_counts(target: Dict[str, int], source: Dict[str, int], sign: int = 1) -> None:
+    for key, value in source.items():
+        updated = target.get(key, 0) + sign * value
+        if updated > 0:
+            target[key] = updated
+        else:
+            target.pop(key, None)
+
+
+class CorpusManifest:
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+        self.summary_path = os.path.join(directory, SUMMARY_FILENAME)
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._last_flush = 0.0
+        self._chunks: Dict[str, List[Dict[str, Any]]] = {}
+        self._chunks_bytes = 0
+        loaded = load_json_state(self.summary_path, None)
+        self.summary: Dict[str, Any] = loaded if isinstance(loaded, dict) else _new_summary()
+        self._catch_up()
+
+    def _read_entries(self, start: int) -> Iterable[Tuple[Dict[str, Any], int]]:
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, "rb") as f:
+            f.seek(start)
+            position = start
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                position += len(raw)
+                try:
+                    yield json.loads(raw), position
+                except json.JSONDecodeError:
+                    continue
+
+    def _catch_up(self) -> None:
+        for entry, position in self._read_entries(int(self.summary.get("manifest_bytes", 0))):
+            self._apply(entry)
+            self.summary["manifest_bytes"] = position
+            self._dirty = True
+        self.flush()
+
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        files = self.summary["files"]
+        name = entry["file"]
+        if entry.get("reset"):
+            previous = files.pop(name, None)
+            if previous:
+                self.summary["total_records"] -= previous["records"]
+                _add_counts(self.summary["topics"], previous["topics"], -1)
+                _add_counts(self.summary["models"], previous["models"], -1)
+            return
+        stats = files.setdefault(
+            name, {"records": 0, "bytes": 0, "sha256": "", "chunks": 0, "topics": {}, "models": {}}
+        )
+        records = int(entry["records"])
+        stats["records"] += records
+        stats["bytes"] = int(entry["offset"]) + int(entry["length"])
+        stats["sha256"] = hashlib.sha256((stats["sha256"] + entry["sha256"]).encode("ascii")).hexdigest()
+        stats["chunks"] += 1
+        if entry.get("topic"):
+            counts = {entry["topic"]: records}
+            _add_counts(stats["topics"], counts)
+            _add_counts(self.summary["topics"], counts)
+        if entry.get("model"):
+            model_counts = {entry["model"]: records}
+            _add_counts(stats["models"], model_counts)
+            _add_counts(self.summary["models"], model_counts)
+        self.summary["total_records"] += records
+
+    def record(self, entries: List[Dict[str, Any]]) -> None:
+        if not entries:
+            return
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self._catch_up_unlocked()
+            with open(self.manifest_path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            for entry in entries:
+                self._apply(entry)
+            self.summary["manifest_bytes"] = int(self.summary["manifest_bytes"]) + len(data)
+            self._dirty = True
+            if time.monotonic() - self._last_flush >= SUMMARY_FLUSH_SECONDS:
+                self.flush()
+
+    def _catch_up_unlocked(self) -> None:
+        size = os.path.getsize(self.manifest_path) if os.path.exists(self.manifest_path) else 0
+        if size != int(self.summary.get("manifest_bytes", 0)):
+            self._catch_up()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                save_json_state(self.summary_path, self.summary)
+            except OSError:
+                return
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def total_records(self) -> int:
+        return int(self.summary["total_records"])
+
+    def records_by_topic(self) -> Dict[str, int]:
+        return dict(self.summary["topics"])
+
+    def records_by_model(self) -> Dict[str, int]:
+        return dict(self.summary["models"])
+
+    def committed_bytes(self, name: str) -> Optional[int]:
+        with self._lock:
+            if os.path.exists(self.manifest_path):
+                self._catch_up_unlocked()
+            stats = self.summary["files"].get(os.path.basename(name))
+            return int(stats["bytes"]) if stats else None
+
+    def file_stats(self, name: str) -> Optional[Dict[str, Any]]:
+        stats = self.summary["files"].get(os.path.basename(name))
+        return dict(stats) if stats else None
+
+    def _load_chunks(self) -> None:
+        for entry, position in self._read_entries(self._chunks_bytes):
+            chunks = self._chunks.setdefault(entry["file"], [])
+            if entry.get("reset"):
+                chunks.clear()
+            else:
+                entry["first_record"] = (
+                    chunks[-1]["first_record"] + chunks[-1]["records"] if chunks else 0
+                )
+                chunks.append(entry)
+            self._chunks_bytes = position
+
+    def locate(self, name: str, index: int) -> Tuple[int, int, Dict[str, Any]]:
+        with self._lock:
+            self._load_chunks()
+            chunks = self._chunks.get(os.path.basename(name)) or []
+            starts = [c["first_record"] for c in chunks]
+            position = bisect.bisect_right(starts, index) - 1
+            if position < 0 or index >= chunks[position]["first_record"] + chunks[position]["records"]:
+                raise IndexError(index)
+            chunk = chunks[position]
+            offsets = chunk["line_offsets"]
+            local = index - chunk["first_record"]
+            start = offsets[local]
+            end = offsets[local + 1] if local + 1 < len(offsets) else int(chunk.get("raw_length", chunk["length"]))
+            if chunk.get("codec"):
+                return start, end - start, chunk
+            return int(chunk["offset"]) + start, end - start, chunk
+
+    def read_record(self, name: str, index: int) -> Dict[str, Any]:
+        offset, length, chunk = self.locate(name, index)
+        with open(os.path.join(self.directory, os.path.basename(name)), "rb") as f:
+            if chunk.get("codec"):
+                f.seek(int(chunk["offset"]))
+                data = decompress_chunk(f.read(int(chunk["length"])), chunk["codec"])
+                record = json.loads(data[offset : offset + length])
+            else:
+                f.seek(offset)
+                record = json.loads(f.read(length))
+        for key in ("topic", "subtopic", "model"):
+            if chunk.get(key):
+                record.setdefault(key, chunk[key])
+        return record
+
+    def iter_records(self, name: str) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            self._load_chunks()
+            chunks = list(self._chunks.get(os.path.basename(name)) or [])
+        if not chunks:
+            return
+        with open(os.path.join(self.directory, os.path.basename(name)), "rb") as f:
+            for chunk in chunks:
+                f.seek(int(chunk["offset"]))
+                data = f.read(int(chunk["length"]))
+                if chunk.get("codec"):
+                    data = decompress_chunk(data, chunk["codec"])
+                for line in data.splitlines():
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    for key in ("topic", "subtopic", "model"):
+                        if chunk.get(key):
+                            record.setdefault(key, chunk[key])
+                    yield record
+
+
+_MANIFESTS: Dict[str, CorpusManifest] = {}
+_MANIFESTS_LOCK = threading.Lock()
+
+
+def get_manifest(directory: str) -> CorpusManifest:
+    key = os.path.abspath(directory)
+    with _MANIFESTS_LOCK:
+        manifest = _MANIFESTS.get(key)
+        if manifest is None:
+            manifest = CorpusManifest(key)
+            _MANIFESTS[key] = manifest
+        return manifest
+
+
+def flush_all() -> None:
+    with _MANIFESTS_LOCK:
+        manifests = list(_MANIFESTS.values())
+    for manifest in manifests:
+        manifest.flush()
+
+
+atexit.register(flush_all)
+
+
+@traced()
+def write_records(
+    path: str,
+    items: List[Dict[str, Any]],
+    mode: str = "a",
+    topic: Optional[str] = None,
+    params: Optional[Dict[str, Any]] = None,
+) -> int:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.basename(path)
+    codec = codec_for_path(path)
+    groups: List[Tuple[Tuple[Any, Any], List[bytes]]] = []
+    for item in items:
+        line = json.dumps({k: item[k] for k in RECORD_FIELDS}, ensure_ascii=False) + "\n"
+        key = (item.get("subtopic"), item.get("model"))
+        if not groups or groups[-1][0] != key:
+            groups.append((key, []))
+        groups[-1][1].append(line.encode("utf-8"))
+    chunks: List[Tuple[Any, Any, List[bytes], bytes, bytes]] = []
+    for (subtopic, model), lines in groups:
+        raw = b"".join(lines)
+        chunks.append((subtopic, model, lines, raw, compress_chunk(raw, codec) if codec else raw))
+    entries: List[Dict[str, Any]] = []
+    if mode == "w":
+        entries.append({"file": name, "reset": True})
+    manifest = get_manifest(directory)
+    with manifest._lock:
+        if mode != "w" and os.path.exists(path):
+            committed = manifest.committed_bytes(name)
+            if committed is not None and os.path.getsize(path) > committed:
+                os.truncate(path, committed)
+        with open(path, mode + "b") as f:
+            offset = f.tell()
+            for subtopic, model, lines, raw, chunk in chunks:
+                line_offsets: List[int] = []
+                position = 0
+                for line in lines:
+                    line_offsets.append(position)
+                    position += len(line)
+                f.write(chunk)
+                entry = {
+                    "file": name,
+                    "offset": offset,
+                    "length": len(chunk),
+                    "records": len(lines),
+                    "line_offsets": line_offsets,
+                    "sha256": hashlib.sha256(chunk).hexdigest(),
+                    "topic": topic,
+                    "subtopic": subtopic,
+                    "model": model,
+                    "params": params or {},
+                    "time": round(time.time(), 3),
+                }
+                if codec:
+                    entry["codec"] = codec
+                    entry["raw_length"] = len(raw)
+                entries.append(entry)
+                offset += len(chunk)
+        manifest.record(entries)
+    return sum(int(e.get("records", 0)) for e in entries)
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查询输出目录的清单索引（无需扫描语料）")
+    parser.add_argument("directories", nargs="+", help="输出目录，如 out multiple_out")
+    parser.add_argument("--by-topic", action="store_true", help="按主题统计条数")
+    parser.add_argument("--by-model", action="store_true", help="按模型统计条数")
+    parser.add_argument("--get", nargs=2, metavar=("FILE", "INDEX"), help="读取某文件第 INDEX 条记录")
+    parser.add_argument("--rebuild", action="store_true", help="从清单日志重建汇总")
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {"total_records": 0, "files": 0, "topics": {}, "models": {}}
+    for directory in args.directories:
+        if args.rebuild:
+            summary_path = os.path.join(directory, SUMMARY_FILENAME)
+            if os.path.exists(summary_path):
+                os.remove(summary_path)
+        manifest = get_manifest(directory)
+        if args.get:
+            print(json.dumps(manifest.read_record(args.get[0], int(args.get[1])), ensure_ascii=False))
+            return
+        report["total_records"] += manifest.total_records()
+        report["files"] += len(manifest.summary["files"])
+        _add_counts(report["topics"], manifest.records_by_topic())
+        _add_counts(report["models"], manifest.records_by_model())
+    if not args.by_topic:
+        report.pop("topics")
+    if not args.by_model:
+        report.pop("models")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from compressed_io import JSONL_SUFFIXES, is_jsonl_path, iter_chunks
+from script_checks import inspect_pair
+from state_store import load_json_state, save_json_state
+
+DEFAULT_INPUTS = ("out", "multiple_out*")
+CACHE_PATH = "corpus_stats_cache.json"
+BATCH_LINES = 4096
+LENGTH_BUCKET = 10
+RATIO_BUCKET = 0.5
+FINGERPRINT_BYTES = 1 << 16
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {
+        "records": 0,
+        "failed": 0,
+        "reasons": {},
+        "chinese_chars": 0,
+        "uyghur_chars": 0,
+        "uyghur_arabic_chars": 0,
+        "chinese_length_hist": {},
+        "uyghur_length_hist": {},
+        "ratio_hist": {},
+        "topics": {},
+    }
+
+
+def _bump(counter: Dict[str, int], key: str, value: int = 1) -> None:
+    counter[key] = counter.get(key, 0) + value
+
+
+def merge_stats(target: Dict[str, Any], source: Dict[str, Any]) -> Dict[str, Any]:
+    for key, value in source.items():
+        if isinstance(value, dict):
+            bucket = target.setdefault(key, {})
+            for name, count in value.items():
+                _bump(bucket, name, count)
+        else:
+            target[key] = target.get(key, 0) + value
+    return target
+
+
+def _decode_batch(lines: List[bytes]) -> List[Any]:
+    try:
+        return json.loads(b"[" + b",".join(lines) + b"]")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        decoded: List[Any] = []
+        for line in lines:
+            try:
+                decoded.append(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                decoded.append(None)
+        return decoded
+
+
+def _check_batch(
+    lines: List[bytes],
+    line_numbers: List[int],
+    path: str,
+    topic: str,
+    stats: Dict[str, Any],
+    failures: List[Dict[str, Any]],
+) -> None:
+    records = _decode_batch(lines)
+    stats["records"] += len(records)
+    _bump(stats["topics"], topic, len(records))
+    for offset, record in enumerate(records):
+        if not isinstance(record, dict):
+            reasons = ["invalid_json"]
+            chinese = uyghur = ""
+            arabic = 0
+        else:
+            chinese = str(record.get("chinese") or "")
+            uyghur = str(record.get("uyghur") or "")
+            reasons, _, ug_counts = inspect_pair(chinese, uyghur)
+            arabic = ug_counts["arabic"]
+        zh_length = len(chinese)
+        ug_length = len(uyghur)
+        stats["chinese_chars"] += zh_length
+        stats["uyghur_chars"] += ug_length
+        stats["uyghur_arabic_chars"] += arabic
+        _bump(stats["chinese_length_hist"], str(zh_length // LENGTH_BUCKET * LENGTH_BUCKET))
+        _bump(stats["uyghur_length_hist"], str(ug_length // LENGTH_BUCKET * LENGTH_BUCKET))
+        if zh_length:
+            ratio = ug_length / zh_length
+            _bump(stats["ratio_hist"], f"{int(ratio / RATIO_BUCKET) * RATIO_BUCKET:.1f}")
+        if reasons:
+            stats["failed"] += 1
+            for reason in reasons:
+                _bump(stats["reasons"], reason)
+            failures.append(
+                {
+                    "file": path,
+                    "line": line_numbers[offset],
+                    "reasons": reasons,
+                    "record": record if isinstance(record, dict) else lines[offset].decode("utf-8", "replace"),
+                }
+            )
+
+
+def scan_file(
+    path: str, start: int, first_line: int, topic: str
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], int, int]:
+    stats = _new_stats()
+    failures: List[Dict[str, Any]] = []
+    pending_stats = _new_stats()
+    pending_failures: List[Dict[str, Any]] = []
+    line_number = committed_lines = first_line
+    end = start
+    batch: List[bytes] = []
+    batch_numbers: List[int] = []
+    for lines, position in iter_chunks(path, start):
+        for raw in lines:
+            line_number += 1
+            line = raw.strip()
+            if not line:
+                continue
+            batch.append(line)
+            batch_numbers.append(line_number)
+            if len(batch) >= BATCH_LINES:
+                _check_batch(batch, batch_numbers, path, topic, pending_stats, pending_failures)
+                batch, batch_numbers = [], []
+        if position > end:
+            if batch:
+                _check_batch(batch, batch_numbers, path, topic, pending_stats, pending_failures)
+                batch, batch_numbers = [], []
+            merge_stats(stats, pending_stats)
+            failures.extend(pending_failures)
+            pending_stats, pending_failures = _new_stats(), []
+            end, committed_lines = position, line_number
+    return stats, failures, end, committed_lines
+
+
+def scanned_fingerprint(path: str, end: int) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        hasher.update(f.read(min(FINGERPRINT_BYTES, end)))
+        if end > FINGERPRINT_BYTES:
+            f.seek(max(end - FINGERPRINT_BYTES, FINGERPRINT_BYTES))
+            hasher.update(f.read(end - f.tell()))
+    return hasher.hexdigest()
+
+
+def _entry_is_current(path: str, entry: Dict[str, Any], info: os.stat_result) -> bool:
+    scanned = int(entry["scanned_bytes"])
+    if entry.get("inode") != info.st_ino or scanned > info.st_size:
+        return False
+    if entry.get("mtime_ns") != info.st_mtime_ns and scanned == info.st_size:
+        return False
+    return entry.get("fingerprint") == scanned_fingerprint(path, scanned)
+
+
+def discover_files(inputs: List[str]) -> List[str]:
+    files: List[str] = []
+    for pattern in inputs:
+        for match in sorted(glob.glob(pattern)):
+            if os.path.isdir(match):
+                for suffix in JSONL_SUFFIXES:
+                    files.extend(sorted(glob.glob(os.path.join(match, "*" + suffix))))
+            elif is_jsonl_path(match):
+                files.append(match)
+    return sorted(set(os.path.abspath(f) for f in files))
+
+
+def topic_for_file(path: str, manifests: Dict[str, Any]) -> str:
+    directory = os.path.dirname(path)
+    if directory not in manifests:
+        from corpus_manifest import SUMMARY_FILENAME
+
+        summary = load_json_state(os.path.join(directory, SUMMARY_FILENAME), {})
+        manifests[directory] = summary.get("files", {}) if isinstance(summary, dict) else {}
+    stats = manifests[directory].get(os.path.basename(path)) or {}
+    topics = stats.get("topics") or {}
+    if len(topics) == 1:
+        return next(iter(topics))
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def run(
+    inputs: List[str], cache_path: str, jobs: int, full: bool
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, int]]:
+    cache = {} if full else load_json_state(cache_path, {})
+    files = discover_files(inputs)
+    manifests: Dict[str, Any] = {}
+    tasks: List[Tuple[str, int, int, str]] = []
+    infos: Dict[str, os.stat_result] = {}
+    for path in files:
+        info = os.stat(path)
+        infos[path] = info
+        entry = cache.get(path)
+        if (
+            entry
+            and entry.get("inode") == info.st_ino
+            and entry.get("mtime_ns") == info.st_mtime_ns
+            and entry["scanned_bytes"] == info.st_size
+        ):
+            continue
+        if not entry or not _entry_is_current(path, entry, info):
+            entry = {"scanned_bytes": 0, "lines": 0, "stats": _new_stats(), "failures": []}
+            cache[path] = entry
+        tasks.append((path, entry["scanned_bytes"], entry["lines"], topic_for_file(path, manifests)))
+    for path in list(cache):
+        if path not in files:
+            del cache[path]
+
+    if tasks:
+        with ProcessPoolExecutor(max_workers=jobs or None) as pool:
+            workers = jobs or os.cpu_count() or 1
+            chunksize = max(len(tasks) // (8 * workers), 1)
+            results = pool.map(scan_file, *zip(*tasks), chunksize=chunksize)
+            for (path, _, _, _), (stats, failures, end, lines) in zip(tasks, results):
+                entry = cache[path]
+                merge_stats(entry["stats"], stats)
+                entry["failures"].extend(failures)
+                entry["scanned_bytes"] = end
+                entry["lines"] = lines
+                entry["inode"] = infos[path].st_ino
+                entry["mtime_ns"] = infos[path].st_mtime_ns
+                entry["fingerprint"] = scanned_fingerprint(path, end)
+        save_json_state(cache_path, cache)
+
+    totals = _new_stats()
+    failures: List[Dict[str, Any]] = []
+    for entry in cache.values():
+        merge_stats(totals, entry["stats"])
+        failures.extend(entry["failures"])
+    return totals, failures, {"files": len(files), "scanned_files": len(tasks)}
+
+
+def build_report(totals: Dict[str, Any], counts: Dict[str, int]) -> Dict[str, Any]:
+    records = totals["records"]
+    return {
+        "files": counts["files"],
+        "scanned_files": counts["scanned_files"],
+        "records": records,
+        "failed": totals["failed"],
+        "failure_reasons": totals["reasons"],
+        "mean_chinese_chars": round(totals["chinese_chars"] / records, 2) if records else 0.0,
+        "mean_uyghur_chars": round(totals["uyghur_chars"] / records, 2) if records else 0.0,
+        "uyghur_to_chinese_char_ratio": round(totals["uyghur_chars"] / totals["chinese_chars"], 3)
+        if totals["chinese_chars"]
+        else 0.0,
+        "uyghur_arabic_share": round(totals["uyghur_arabic_chars"] / totals["uyghur_chars"], 4)
+        if totals["uyghur_chars"]
+        else 0.0,
+        "chinese_length_hist": dict(sorted(totals["chinese_length_hist"].items(), key=lambda kv: int(kv[0]))),
+        "uyghur_length_hist": dict(sorted(totals["uyghur_length_hist"].items(), key=lambda kv: int(kv[0]))),
+        "ratio_hist": dict(sorted(totals["ratio_hist"].items(), key=lambda kv: float(kv[0]))),
+        "topics": totals["topics"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="并行统计并校验语料（增量扫描）")
+    parser.add_argument("inputs", nargs="*", default=list(DEFAULT_INPUTS), help="目录或 JSONL 文件（支持通配符）")
+    parser.add_argument("--report", default="corpus_report.json", help="JSON 报告输出路径")
+    parser.add_argument("--failures", default="corpus_failures.jsonl", help="未通过校验的记录输出路径")
+    parser.add_argument("--cache", default=CACHE_PATH, help="增量扫描缓存")
+    parser.add_argument("--jobs", type=int, default=0, help="进程数，默认等于 CPU 数")
+    parser.add_argument("--full", action="store_true", help="忽略缓存全部重新扫描")
+    parser.add_argument("--strict", action="store_true", help="存在未通过的记录时返回非零退出码")
+    args = parser.parse_args()
+
+    totals, failures, counts = run(args.inputs, args.cache, args.jobs, args.full)
+    report = build_report(totals, counts)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    with open(args.failures, "w", encoding="utf-8") as f:
+        for failure in failures:
+            f.write(json.dumps(failure, ensure_ascii=False) + "\n")
+    print(
+        f"文件 {counts['files']} 个（本次扫描 {counts['scanned_files']} 个），"
+        f"记录 {report['records']} 条，未通过 {report['failed']} 条。报告: {args.report}"
+    )
+    if args.strict and report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
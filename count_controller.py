@@ -0,0 +1,99 @@
+import threading
+from typing import Any, Dict, List, Tuple
+
+from state_store import load_json_state, save_json_state
+
+CANDIDATE_COUNTS = (5, 10, 15, 20, 25, 30, 40, 50)
+DEFAULT_COUNT = 20
+MIN_SAMPLES = 3
+TRUNCATION_RATIO = 0.9
+LENGTH_BAND = 25
+EWMA_ALPHA = 0.25
+
+
+def _ewma(previous: float | None, value: float) -> float:
+    if previous is None:
+        return value
+    return previous + EWMA_ALPHA * (value - previous)
+
+
+def _new_bucket() -> Dict[str, Any]:
+    return {"requests": 0, "ratio": None, "truncation": None, "latency": None}
+
+
+class CountController:
+    def __init__(self, stats_path: str = "") -> None:
+        self.stats_path = stats_path
+        self._lock = threading.Lock()
+        loaded = load_json_state(stats_path, {})
+        self._stats: Dict[str, Dict[str, Dict[str, Any]]] = loaded if isinstance(loaded, dict) else {}
+
+    def _key(self, model: str, length: int) -> str:
+        return f"{model}@{int(length) // LENGTH_BAND * LENGTH_BAND}"
+
+    def _bucket_for(self, count: int) -> int:
+        for candidate in CANDIDATE_COUNTS:
+            if count <= candidate:
+                return candidate
+        return CANDIDATE_COUNTS[-1]
+
+    def expected_pairs_per_second(self, bucket: Dict[str, Any], count: int) -> float | None:
+        if bucket["requests"] < 1 or not bucket["latency"]:
+            return None
+        return count * float(bucket["ratio"]) / float(bucket["latency"])
+
+    def best_count(self, model: str, length: int) -> int:
+        with self._lock:
+            buckets = self._stats.get(self._key(model, length), {})
+            scored: List[Tuple[float, int]] = []
+            for count in CANDIDATE_COUNTS:
+                bucket = buckets.get(str(count))
+                if bucket and bucket["requests"] >= MIN_SAMPLES:
+                    score = self.expected_pairs_per_second(bucket, count)
+                    if score is not None:
+                        scored.append((score, count))
+            if not scored:
+                return DEFAULT_COUNT
+            best = max(scored)[1]
+            position = CANDIDATE_COUNTS.index(best)
+            for neighbour in (position + 1, position - 1):
+                if 0 <= neighbour < len(CANDIDATE_COUNTS):
+                    candidate = CANDIDATE_COUNTS[neighbour]
+                    bucket = buckets.get(str(candidate))
+                    if not bucket or bucket["requests"] < MIN_SAMPLES:
+                        return candidate
+            return best
+
+    def plan_request(self, model: str, length: int, remaining: int) -> int:
+        if remaining <= 0:
+            return 0
+        chosen = self.best_count(model, length)
+        leftover = remaining - chosen
+        if leftover <= 0:
+            return remaining
+        if leftover < max(CANDIDATE_COUNTS[0], chosen // 4) and remaining <= CANDIDATE_COUNTS[-1]:
+            return remaining
+        return chosen
+
+    def record(self, model: str, length: int, requested: int, returned: int, latency: float) -> None:
+        if requested <= 0:
+            return
+        ratio = min(returned / requested, 1.0)
+        with self._lock:
+            buckets = self._stats.setdefault(self._key(model, length), {})
+            bucket = buckets.setdefault(str(self._bucket_for(requested)), _new_bucket())
+            bucket["requests"] += 1
+            bucket["ratio"] = _ewma(bucket["ratio"], ratio)
+            bucket["truncation"] = _ewma(bucket["truncation"], 1.0 if ratio < TRUNCATION_RATIO else 0.0)
+            bucket["latency"] = _ewma(bucket["latency"], max(latency, 1e-3))
+            try:
+                save_json_state(self.stats_path, self._stats)
+            except OSError:
+                pass
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        with self._lock:
+            return {
+                key: {count: dict(bucket) for count, bucket in buckets.items()}
+                for key, buckets in self._stats.items()
+            }
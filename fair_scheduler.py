@@ -0,0 +1,104 @@
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+DEFAULT_SESSION = "default"
+INTERACTIVE_WEIGHT = 4.0
+BULK_WEIGHT = 1.0
+MAX_BULK_WAIT_SECONDS = 30.0
+
+_session: contextvars.ContextVar[str] = contextvars.ContextVar("fair_session", default=DEFAULT_SESSION)
+_interactive: contextvars.ContextVar[bool] = contextvars.ContextVar("fair_interactive", default=True)
+
+
+@contextmanager
+def scheduling_context(session: str | None, interactive: bool = True) -> Iterator[None]:
+    session_token = _session.set(session or DEFAULT_SESSION)
+    interactive_token = _interactive.set(interactive)
+    try:
+        yield
+    finally:
+        _session.reset(session_token)
+        _interactive.reset(interactive_token)
+
+
+class _Ticket:
+    __slots__ = ("session", "interactive", "start_tag", "seq", "enqueued")
+
+    def __init__(self, session: str, interactive: bool, start_tag: float, seq: int) -> None:
+        self.session = session
+        self.interactive = interactive
+        self.start_tag = start_tag
+        self.seq = seq
+        self.enqueued = time.monotonic()
+
+    def key(self, now: float) -> Tuple[int, float, int]:
+        promoted = self.interactive or now - self.enqueued >= MAX_BULK_WAIT_SECONDS
+        return (0 if promoted else 1, self.start_tag, self.seq)
+
+
+class FairScheduler:
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(capacity, 1)
+        self._cond = threading.Condition()
+        self._waiting: List[_Ticket] = []
+        self._active = 0
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._active_by_session: Dict[str, int] = {}
+        self._seq = itertools.count()
+
+    def _ordered(self) -> List[_Ticket]:
+        now = time.monotonic()
+        return sorted(self._waiting, key=lambda t: t.key(now))
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        session = _session.get()
+        interactive = _interactive.get()
+        weight = INTERACTIVE_WEIGHT if interactive else BULK_WEIGHT
+        with self._cond:
+            start_tag = max(self._virtual_time, self._last_finish.get(session, 0.0))
+            self._last_finish[session] = start_tag + 1.0 / weight
+            ticket = _Ticket(session, interactive, start_tag, next(self._seq))
+            self._waiting.append(ticket)
+            while self._active >= self.capacity or self._ordered()[0] is not ticket:
+                self._cond.wait(1.0)
+            self._waiting.remove(ticket)
+            self._active += 1
+            self._active_by_session[session] = self._active_by_session.get(session, 0) + 1
+            self._virtual_time = max(self._virtual_time, ticket.start_tag)
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                remaining = self._active_by_session.get(session, 1) - 1
+                if remaining:
+                    self._active_by_session[session] = remaining
+                else:
+                    self._active_by_session.pop(session, None)
+                if not self._waiting and not self._active:
+                    self._last_finish.clear()
+                    self._virtual_time = 0.0
+                self._cond.notify_all()
+
+    def position(self, session: str | None) -> int:
+        with self._cond:
+            for index, ticket in enumerate(self._ordered()):
+                if ticket.session == (session or DEFAULT_SESSION):
+                    return index + 1
+        return 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "active": self._active,
+                "waiting": len(self._waiting),
+                "sessions": len(self._active_by_session),
+            }
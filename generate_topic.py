@@ -1,10 +1,17 @@
 import json
+import os
 import re
-from typing import Any, List
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
 
-import requests
+from model_router import ModelRouter
+from tracing import span, traced
+from transcript_recorder import RECORDER, Capture
+from usage_ledger import LEDGER, BudgetExceeded
 
-HAPPY_API_HOST = "https://happyapi.org/v1"
+HAPPY_API_HOST = os.getenv("HAPPY_API_HOST", "https://happyapi.org/v1")
 MODEL = "gemini-3-pro"
 
 MODELS = (
@@ -18,6 +25,31 @@ MODELS = (
     "gemini-2.5-flash-lite",
 )
 
+MODEL_STATS_PATH = os.getenv("MODEL_STATS_PATH", "model_stats.json")
+ROUTER = ModelRouter(MODEL_STATS_PATH)
+STREAM_INCLUDE_USAGE = os.getenv("STREAM_INCLUDE_USAGE", "1") != "0"
+if os.getenv("ROUTE_BY_COST", "0") != "0":
+    ROUTER.set_cost_model(LEDGER.cost_per_pair)
+
+_upstream_gate: Callable[[], ContextManager[Any]] = nullcontext
+
+
+def set_upstream_gate(gate: Callable[[], ContextManager[Any]] | None) -> None:
+    global _upstream_gate
+    _upstream_gate = gate or nullcontext
+
+
+def upstream_gate() -> ContextManager[Any]:
+    return _upstream_gate()
+
+
+def limit_upstream_concurrency(limit: int) -> None:
+    if limit <= 0:
+        set_upstream_gate(None)
+        return
+    semaphore = threading.BoundedSemaphore(limit)
+    set_upstream_gate(lambda: semaphore)
+
 
 def iter_model_fallbacks(primary: str) -> List[str]:
     ordered = [primary] + [m for m in MODELS if m != primary]
@@ -27,7 +59,8 @@ def iter_model_fallbacks(primary: str) -> List[str]:
         if name and name not in seen:
             seen.add(name)
             unique.append(name)
-    return unique
+    return ROUTER.order(unique)
+
 
 def stream_chat_completion(
     instruction: str,
@@ -36,56 +69,178 @@ def stream_chat_completion(
     model: str = MODEL,
     timeout: int = 300,
 ) -> str:
+    text, _ = stream_chat_completion_with_model(instruction, token, host, model, timeout)
+    return text
+
+
+class UpstreamAttempt:
+    def __init__(self, call: "UpstreamCall", attempt_no: int, candidate: str, reservation: float) -> None:
+        self.call = call
+        self.attempt_no = attempt_no
+        self.candidate = candidate
+        self.reservation = reservation
+        self.payload = completion_payload(call.instruction, candidate)
+        self.capture: Capture | None = None
+        self.started = 0.0
+        self.settled = False
+
+    def start(self) -> None:
+        ROUTER.begin(self.candidate)
+        if RECORDER is not None:
+            self.capture = RECORDER.begin(
+                self.call.call_id, self.attempt_no, self.call.instruction, self.call.model, self.candidate
+            )
+        self.started = time.monotonic()
+
+    def succeeded(self, text: str, usage: Optional[Dict[str, Any]]) -> None:
+        self.settled = True
+        if self.capture is not None:
+            RECORDER.finish(self.capture)
+        ROUTER.record_success(self.candidate, time.monotonic() - self.started)
+        LEDGER.record(self.candidate, self.call.instruction, text, usage, self.reservation)
+
+    def failed(self, exc: Exception) -> None:
+        self.settled = True
+        ROUTER.record_failure(self.candidate, time.monotonic() - self.started)
+        LEDGER.release(self.reservation)
+        if self.capture is not None:
+            self.capture.error(exc)
+            RECORDER.finish(self.capture)
+        self.call.last_error = exc
+
+    def close(self) -> None:
+        if self.settled:
+            return
+        if self.started:
+            ROUTER.abandon(self.candidate)
+        LEDGER.release(self.reservation)
+
+
+class UpstreamCall:
+    def __init__(self, instruction: str, model: str = MODEL, fallback: bool = True) -> None:
+        self.instruction = instruction
+        self.model = model
+        self.fallback = fallback
+        self.call_id = RECORDER.new_call() if RECORDER is not None else ""
+        self.last_error: Exception | None = None
+        self.over_budget = False
+
+    def attempts(self) -> Iterator[UpstreamAttempt]:
+        candidates = iter_model_fallbacks(self.model) if self.fallback else [self.model]
+        for attempt_no, candidate in enumerate(LEDGER.plan(candidates)):
+            reservation = LEDGER.reserve(candidate, self.instruction)
+            if reservation is None:
+                self.over_budget = True
+                continue
+            yield UpstreamAttempt(self, attempt_no, candidate, reservation)
+
+    def exhausted(self) -> Tuple[str, str]:
+        if self.last_error:
+            raise self.last_error
+        if self.over_budget:
+            raise BudgetExceeded(f"已达到预算上限 ${LEDGER.budget_usd:g}，停止请求。")
+        return "", self.model
+
+
+@traced("stream_chat_completion")
+def stream_chat_completion_with_model(
+    instruction: str,
+    token: str,
+    host: str,
+    model: str = MODEL,
+    timeout: int = 300,
+    fallback: bool = True,
+) -> Tuple[str, str]:
+    import requests
+
+    url, headers = completion_endpoint(host, token)
+    call = UpstreamCall(instruction, model, fallback)
+    for attempt in call.attempts():
+        with _upstream_gate(), span("upstream_attempt", "http", model=attempt.candidate) as attempt_span:
+            attempt.start()
+            try:
+                text, usage = _read_completion_stream(url, headers, attempt.payload, timeout, attempt.capture)
+                attempt.succeeded(text, usage)
+                return text, attempt.candidate
+            except requests.RequestException as exc:
+                attempt_span.set(error=type(exc).__name__)
+                attempt.failed(exc)
+            finally:
+                attempt.close()
+    return call.exhausted()
+
+
+def completion_endpoint(host: str, token: str) -> Tuple[str, Dict[str, str]]:
     url = host.rstrip("/") + "/chat/completions"
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
         "Accept": "text/event-stream",
     }
-    last_error: Exception | None = None
-    for candidate in iter_model_fallbacks(model):
-        payload = {
-            "model": candidate,
-            "messages": [{"role": "user", "content": instruction}],
-            "stream": True,
-        }
-        out_parts: List[str] = []
-        try:
-            with requests.post(
-                url,
-                headers=headers,
-                json=payload,
-                stream=True,
-                timeout=timeout,
-            ) as r:
-                r.raise_for_status()
-                r.encoding = "utf-8"
-                for line in r.iter_lines(decode_unicode=True):
-                    if not line or not line.startswith("data:"):
-                        continue
-                    data = line[len("data:"):].strip()
-                    if data == "[DONE]":
-                        break
-                    try:
-                        chunk = json.loads(data)
-                    except json.JSONDecodeError:
-                        continue
-                    choices = chunk.get("choices") or []
-                    if not choices:
-                        continue
-                    delta = (choices[0] or {}).get("delta") or {}
-                    content = delta.get("content")
-                    if content:
-                        out_parts.append(content)
-            return "".join(out_parts)
-        except requests.RequestException as exc:
-            last_error = exc
-            continue
-    if last_error:
-        raise last_error
-    return ""
+    return url, headers
+
+
+def completion_payload(instruction: str, model: str) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
+        "model": model,
+        "messages": [{"role": "user", "content": instruction}],
+        "stream": True,
+    }
+    if STREAM_INCLUDE_USAGE:
+        payload["stream_options"] = {"include_usage": True}
+    return payload
 
 
+def parse_sse_line(line: str) -> Tuple[str, bool, Optional[Dict[str, Any]]]:
+    if not line or not line.startswith("data:"):
+        return "", False, None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return "", True, None
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        return "", False, None
+    usage = chunk.get("usage") if isinstance(chunk.get("usage"), dict) else None
+    choices = chunk.get("choices") or []
+    if not choices:
+        return "", False, usage
+    delta = (choices[0] or {}).get("delta") or {}
+    return delta.get("content") or "", False, usage
+
+
+def _read_completion_stream(
+    url: str, headers: dict, payload: dict, timeout: int, capture: Capture | None = None
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    import requests
+
+    out_parts: List[str] = []
+    usage: Optional[Dict[str, Any]] = None
+    with requests.post(
+        url,
+        headers=headers,
+        json=payload,
+        stream=True,
+        timeout=timeout,
+    ) as r:
+        if capture is not None:
+            capture.response(r.status_code)
+        r.raise_for_status()
+        r.encoding = "utf-8"
+        for line in r.iter_lines(decode_unicode=True):
+            if capture is not None and line:
+                capture.line(line)
+            content, done, chunk_usage = parse_sse_line(line)
+            if done:
+                break
+            if chunk_usage:
+                usage = chunk_usage
+            if content:
+                out_parts.append(content)
+    return "".join(out_parts), usage
+
+
+@traced()
 def parse_json_from_text(text: str) -> Any:
     try:
         return json.loads(text)
@@ -122,18 +277,27 @@ def build_subtopic_prompt(topic: str, count: int) -> str:
     )
 
 
+@traced()
 def generate_subtopics(
     topic: str,
     subtopic_count: int,
     default_translation_count: int,
     token: str,
 ) -> List[List[str]]:
+    prompt = prepare_subtopic_prompt(topic, subtopic_count)
+    response = stream_chat_completion(prompt, token, HAPPY_API_HOST, MODEL)
+    return subtopic_rows_from_response(response, default_translation_count)
+
+
+def prepare_subtopic_prompt(topic: str, subtopic_count: int) -> str:
     if not topic or not topic.strip():
         raise ValueError("请输入中文大主题。")
     if subtopic_count < 1 or subtopic_count > 50:
         raise ValueError("子话题数量必须在 1 到 50 之间。")
-    prompt = build_subtopic_prompt(topic.strip(), int(subtopic_count))
-    response = stream_chat_completion(prompt, token, HAPPY_API_HOST, MODEL)
+    return build_subtopic_prompt(topic.strip(), int(subtopic_count))
+
+
+def subtopic_rows_from_response(response: str, default_translation_count: int) -> List[List[Any]]:
     parsed = parse_json_from_text(response)
     topics = normalize_topics(parsed)
     if not topics:
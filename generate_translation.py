@@ -1,8 +1,36 @@
-from typing import Any, Dict, Iterable, List, Tuple
+import json
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Tuple
 
-from generate_topic import HAPPY_API_HOST, MODEL, parse_json_from_text, stream_chat_completion
+from count_controller import CountController
+from generate_topic import (
+    HAPPY_API_HOST,
+    MODEL,
+    ROUTER,
+    iter_model_fallbacks,
+    parse_json_from_text,
+    stream_chat_completion_with_model,
+)
+from quality_filter import QualityFilter
+from tracing import traced
+from usage_ledger import LEDGER
 
+RESPONSE_FORMAT = os.getenv("TRANSLATION_RESPONSE_FORMAT", "json")
+ADAPTIVE_COUNT = os.getenv("ADAPTIVE_TRANSLATION_COUNT", "1") != "0"
+COUNT_STATS_PATH = os.getenv("COUNT_STATS_PATH", "count_stats.json")
+COUNT_CONTROLLER = CountController(COUNT_STATS_PATH)
+QUALITY_FILTER: Optional[QualityFilter] = (
+    QualityFilter() if os.getenv("TRANSLATION_QUALITY_FILTER", "1") != "0" else None
+)
+MAX_EMPTY_RESPONSES = 2
+MAX_TOPUP_REQUESTS = 3
 
+NUMBERED_LINE_RE = re.compile(r"^\s*(\d+)\s*[.、:：)）]\s*(.*?)\s*$")
+
+
+@traced()
 def normalize_translations(data: Any) -> List[Dict[str, str]]:
     items: List[Dict[str, str]] = []
     raw = data
@@ -11,37 +39,295 @@ def normalize_translations(data: Any) -> List[Dict[str, str]]:
     if not isinstance(raw, list):
         return items
     for entry in raw:
-        if not isinstance(entry, dict):
+        if isinstance(entry, dict):
+            zh = str(entry.get("chinese", "")).strip()
+            ug = str(entry.get("uyghur", "")).strip()
+        elif isinstance(entry, (list, tuple)) and len(entry) >= 2:
+            zh = str(entry[0]).strip()
+            ug = str(entry[1]).strip()
+        else:
             continue
-        zh = str(entry.get("chinese", "")).strip()
-        ug = str(entry.get("uyghur", "")).strip()
         if zh and ug:
             items.append({"chinese": zh, "uyghur": ug})
     return items
 
 
-def build_translation_prompt(subtopic: str, count: int, length: int) -> str:
+def strip_code_fence(text: str) -> str:
+    lines = [line for line in text.splitlines() if not line.strip().startswith("```")]
+    return "\n".join(lines)
+
+
+def parse_json_response(text: str) -> List[Dict[str, str]]:
+    return normalize_translations(parse_json_from_text(text))
+
+
+def parse_tsv_response(text: str) -> List[Dict[str, str]]:
+    pairs: List[List[str]] = []
+    for line in strip_code_fence(text).splitlines():
+        if "\t" not in line:
+            continue
+        zh, _, ug = line.partition("\t")
+        pairs.append([zh, ug])
+    return normalize_translations(pairs)
+
+
+def parse_numbered_lines_response(text: str) -> List[Dict[str, str]]:
+    grouped: Dict[int, List[str]] = {}
+    order: List[int] = []
+    for line in strip_code_fence(text).splitlines():
+        match = NUMBERED_LINE_RE.match(line)
+        if not match:
+            continue
+        number = int(match.group(1))
+        if number not in grouped:
+            grouped[number] = []
+            order.append(number)
+        grouped[number].append(match.group(2))
+    return normalize_translations([grouped[n][:2] for n in order])
+
+
+def validate_json_response(text: str) -> List[str]:
+    parsed = parse_json_from_text(text)
+    if parsed is None:
+        return ["无法解析JSON"]
+    if isinstance(parsed, dict) and not isinstance(parsed.get("translations"), list):
+        return ["缺少 translations 列表"]
+    return []
+
+
+def validate_pairs_response(text: str) -> List[str]:
+    parsed = parse_json_from_text(text)
+    if not isinstance(parsed, list):
+        return ["返回内容不是JSON数组"]
+    errors: List[str] = []
+    for index, entry in enumerate(parsed):
+        if not isinstance(entry, list) or len(entry) != 2:
+            errors.append(f"第 {index + 1} 项不是 [中文, 维吾尔语] 二元组")
+    return errors
+
+
+def validate_tsv_response(text: str) -> List[str]:
+    errors: List[str] = []
+    for index, line in enumerate(strip_code_fence(text).splitlines()):
+        if line.strip() and line.count("\t") != 1:
+            errors.append(f"第 {index + 1} 行不是两列TSV")
+    return errors
+
+
+def validate_numbered_lines_response(text: str) -> List[str]:
+    counts: Dict[int, int] = {}
+    for line in strip_code_fence(text).splitlines():
+        match = NUMBERED_LINE_RE.match(line)
+        if match:
+            number = int(match.group(1))
+            counts[number] = counts.get(number, 0) + 1
+    if not counts:
+        return ["没有编号行"]
+    return [f"编号 {n} 有 {c} 行，应为 2 行" for n, c in counts.items() if c != 2]
+
+
+def render_json_response(pairs: List[Tuple[str, str]]) -> str:
+    return json.dumps(
+        {"translations": [{"chinese": zh, "uyghur": ug} for zh, ug in pairs]},
+        ensure_ascii=False,
+    )
+
+
+def render_pairs_response(pairs: List[Tuple[str, str]]) -> str:
+    return json.dumps([[zh, ug] for zh, ug in pairs], ensure_ascii=False)
+
+
+def render_tsv_response(pairs: List[Tuple[str, str]]) -> str:
+    return "\n".join(f"{zh}\t{ug}" for zh, ug in pairs)
+
+
+def render_numbered_lines_response(pairs: List[Tuple[str, str]]) -> str:
+    return "\n".join(f"{i}. {zh}\n{i}. {ug}" for i, (zh, ug) in enumerate(pairs, start=1))
+
+
+RESPONSE_FORMATS: Dict[str, Dict[str, Any]] = {
+    "json": {
+        "instruction": (
+            "仅返回JSON，不要输出额外说明。\n"
+            '返回格式: {"translations": [{"chinese": "中文", "uyghur": "维吾尔语"}]}'
+        ),
+        "parse": parse_json_response,
+        "validate": validate_json_response,
+        "render": render_json_response,
+    },
+    "pairs": {
+        "instruction": (
+            "仅返回JSON数组，不要输出额外说明，每项为 [中文, 维吾尔语]。\n"
+            '返回格式: [["中文", "维吾尔语"]]'
+        ),
+        "parse": parse_json_response,
+        "validate": validate_pairs_response,
+        "render": render_pairs_response,
+    },
+    "tsv": {
+        "instruction": (
+            "仅返回TSV，不要输出表头或额外说明，每行一条，中文与维吾尔语之间用一个制表符分隔。\n"
+            "返回格式: 中文<TAB>维吾尔语"
+        ),
+        "parse": parse_tsv_response,
+        "validate": validate_tsv_response,
+        "render": render_tsv_response,
+    },
+    "lines": {
+        "instruction": (
+            "仅返回编号行，不要输出额外说明，每条两行，编号相同：第一行中文，第二行维吾尔语。\n"
+            "返回格式:\n1. 中文\n1. 维吾尔语"
+        ),
+        "parse": parse_numbered_lines_response,
+        "validate": validate_numbered_lines_response,
+        "render": render_numbered_lines_response,
+    },
+}
+
+
+def get_response_format(name: str) -> Dict[str, Any]:
+    fmt = RESPONSE_FORMATS.get(name)
+    if fmt is None:
+        raise ValueError(f"不支持的返回格式: {name}，可选: {', '.join(RESPONSE_FORMATS)}")
+    return fmt
+
+
+def parse_translation_response(text: str, response_format: str = RESPONSE_FORMAT) -> List[Dict[str, str]]:
+    parser: Callable[[str], List[Dict[str, str]]] = get_response_format(response_format)["parse"]
+    return parser(text)
+
+
+def validate_translation_response(text: str, response_format: str = RESPONSE_FORMAT) -> List[str]:
+    return get_response_format(response_format)["validate"](text)
+
+
+def build_translation_prompt(
+    subtopic: str, count: int, length: int, response_format: str = RESPONSE_FORMAT
+) -> str:
     return (
         "请生成用于训练的中-维吾尔语翻译数据，中文为原文，维吾尔语使用阿拉伯字母。\n"
         f"子话题: {subtopic}\n"
         f"生成数量: {count}\n"
         f"每条中文长度约 {length} 个字。\n"
-        "仅返回JSON，不要输出额外说明。\n"
-        '返回格式: {"translations": [{"chinese": "中文", "uyghur": "维吾尔语"}]}'
+        + get_response_format(response_format)["instruction"]
     )
 
 
+@traced()
+def request_translation_batch(
+    subtopic: str,
+    count: int,
+    length: int,
+    token: str,
+    response_format: str = RESPONSE_FORMAT,
+    quality_filter: Optional[QualityFilter] = QUALITY_FILTER,
+) -> Tuple[List[Dict[str, str]], int]:
+    prompt = build_translation_prompt(subtopic, count, length, response_format)
+    started = time.monotonic()
+    response, served_by = stream_chat_completion_with_model(
+        prompt, token, HAPPY_API_HOST, MODEL
+    )
+    return finish_translation_batch(
+        response, served_by, count, length, response_format, time.monotonic() - started, quality_filter
+    )
+
+
+def finish_translation_batch(
+    response: str,
+    served_by: str,
+    count: int,
+    length: int,
+    response_format: str,
+    elapsed: float,
+    quality_filter: Optional[QualityFilter] = QUALITY_FILTER,
+) -> Tuple[List[Dict[str, str]], int]:
+    items = parse_translation_response(response, response_format)
+    COUNT_CONTROLLER.record(served_by, length, count, len(items), elapsed)
+    items, rejected = filter_translations(items[:count], length, quality_filter)
+    ROUTER.record_pairs(served_by, len(items), elapsed)
+    for item in items:
+        item["model"] = served_by
+    LEDGER.record_pairs(served_by, len(items))
+    return items, rejected
+
+
+@traced()
+def filter_translations(
+    items: List[Dict[str, str]], length: int, quality_filter: Optional[QualityFilter]
+) -> Tuple[List[Dict[str, str]], int]:
+    if quality_filter is None or not items:
+        return items, 0
+    kept, rejected = quality_filter.apply(items, length)
+    return kept, len(rejected)
+
+
+def estimate_translation_calls(count: int, length: int, adaptive: bool = ADAPTIVE_COUNT) -> int:
+    if count <= 0:
+        return 0
+    if not adaptive:
+        return 1
+    first_choice = iter_model_fallbacks(MODEL)[0]
+    return -(-count // max(COUNT_CONTROLLER.best_count(first_choice, length), 1))
+
+
+def plan_subtopic_requests(
+    count: int,
+    length: int,
+    adaptive: bool = ADAPTIVE_COUNT,
+) -> Generator[int, Tuple[List[Dict[str, str]], int], List[Dict[str, str]]]:
+    items: List[Dict[str, str]] = []
+    if not adaptive:
+        request_size = count
+        for _ in range(1 + MAX_TOPUP_REQUESTS):
+            batch, rejected = yield request_size
+            items.extend(batch)
+            if not rejected or len(items) >= count:
+                break
+            request_size = min(rejected, count - len(items))
+        return items[:count]
+    budget = estimate_translation_calls(count, length, adaptive) + MAX_TOPUP_REQUESTS
+    empty_streak = 0
+    while len(items) < count and budget > 0 and empty_streak < MAX_EMPTY_RESPONSES:
+        model = iter_model_fallbacks(MODEL)[0]
+        batch, rejected = yield COUNT_CONTROLLER.plan_request(model, length, count - len(items))
+        budget -= 1
+        empty_streak = 0 if batch or rejected else empty_streak + 1
+        items.extend(batch)
+    return items[:count]
+
+
+def generate_subtopic_translations(
+    subtopic: str,
+    count: int,
+    length: int,
+    token: str,
+    response_format: str = RESPONSE_FORMAT,
+    adaptive: bool = ADAPTIVE_COUNT,
+    quality_filter: Optional[QualityFilter] = QUALITY_FILTER,
+) -> List[Dict[str, str]]:
+    plan = plan_subtopic_requests(count, length, adaptive)
+    try:
+        request_size = next(plan)
+        while True:
+            request_size = plan.send(
+                request_translation_batch(subtopic, request_size, length, token, response_format, quality_filter)
+            )
+    except StopIteration as finished:
+        return finished.value
+
+
 def generate_translations(
     topic_rows: List[List[Any]],
     token: str,
     length: int,
+    response_format: str = RESPONSE_FORMAT,
 ) -> List[Dict[str, str]]:
     if not topic_rows:
         raise ValueError("没有子话题，请先生成子话题。")
     if length < 20 or length > 100:
         raise ValueError("翻译长度必须在 20 到 100 之间。")
     translations: List[Dict[str, str]] = []
-    for _, _, items in generate_translations_stream(topic_rows, token, length):
+    for _, _, items in generate_translations_stream(topic_rows, token, length, response_format):
         if items:
             translations.extend(items)
     return translations
@@ -51,28 +337,39 @@ def generate_translations_stream(
     topic_rows: List[List[Any]],
     token: str,
     length: int,
+    response_format: str = RESPONSE_FORMAT,
+    adaptive: bool = ADAPTIVE_COUNT,
+    quality_filter: Optional[QualityFilter] = QUALITY_FILTER,
 ) -> Iterable[Tuple[int, int, List[Dict[str, str]]]]:
-    if not topic_rows:
-        raise ValueError("没有子话题，请先生成子话题。")
-    if length < 20 or length > 100:
-        raise ValueError("翻译长度必须在 20 到 100 之间。")
+    validate_translation_request(topic_rows, length, response_format)
     total_rows = len(topic_rows)
     yield 0, total_rows, []
     for index, row in enumerate(topic_rows):
         items: List[Dict[str, str]] = []
-        if not row or len(row) < 2:
-            yield index + 1, total_rows, items
-            continue
-        subtopic = str(row[0]).strip()
-        try:
-            count = int(float(row[1]))
-        except (ValueError, TypeError):
-            count = 0
+        subtopic, count = parse_topic_row(row)
         if not subtopic or count <= 0:
             yield index + 1, total_rows, items
             continue
-        prompt = build_translation_prompt(subtopic, count, length)
-        response = stream_chat_completion(prompt, token, HAPPY_API_HOST, MODEL)
-        parsed = parse_json_from_text(response)
-        items = normalize_translations(parsed)
+        items = generate_subtopic_translations(
+            subtopic, count, length, token, response_format, adaptive, quality_filter
+        )
         yield index + 1, total_rows, items
+
+
+def validate_translation_request(topic_rows: List[List[Any]], length: int, response_format: str) -> None:
+    if not topic_rows:
+        raise ValueError("没有子话题，请先生成子话题。")
+    if length < 20 or length > 100:
+        raise ValueError("翻译长度必须在 20 到 100 之间。")
+    get_response_format(response_format)
+
+
+def parse_topic_row(row: List[Any]) -> Tuple[str, int]:
+    if not row or len(row) < 2:
+        return "", 0
+    subtopic = str(row[0]).strip()
+    try:
+        count = int(float(row[1]))
+    except (ValueError, TypeError):
+        count = 0
+    return subtopic, count
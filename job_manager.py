@@ -0,0 +1,141 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id: str, session: str | None = None, display_window: int = 0) -> None:
+        self.id = job_id
+        self.session = session
+        self.status = JOB_QUEUED
+        self.created = time.time()
+        self.finished: float | None = None
+        self.current = 0
+        self.total = 0
+        self.translations: deque = deque(maxlen=display_window or None)
+        self.total_items = 0
+        self.result_path: str | None = None
+        self.error: str | None = None
+        self.version = 0
+        self.cancel_requested = False
+        self._cond = threading.Condition()
+
+    def _bump(self) -> None:
+        self.version += 1
+        self._cond.notify_all()
+
+    def start(self) -> None:
+        with self._cond:
+            self.status = JOB_RUNNING
+            self._bump()
+
+    def update(self, current: int, total: int, items: List[Dict[str, str]]) -> None:
+        with self._cond:
+            if self.cancel_requested:
+                raise JobCancelled(self.id)
+            self.current = current
+            self.total = total
+            if items:
+                self.translations.extend(items)
+                self.total_items += len(items)
+            self._bump()
+
+    def finish(self, status: str, result_path: str | None = None, error: str | None = None) -> None:
+        with self._cond:
+            self.status = status
+            self.result_path = result_path
+            self.error = error
+            self.finished = time.time()
+            self._bump()
+
+    def wait_for_update(self, last_version: int, timeout: float) -> int:
+        with self._cond:
+            if self.version == last_version and self.status not in FINISHED_STATES:
+                self._cond.wait(timeout)
+            return self.version
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "current": self.current,
+                "total": self.total,
+                "translations": list(self.translations),
+                "total_items": self.total_items,
+                "result_path": self.result_path,
+                "error": self.error,
+                "version": self.version,
+            }
+
+
+class JobManager:
+    def __init__(
+        self, max_workers: int = 8, max_finished_jobs: int = 200, display_window: int = 0
+    ) -> None:
+        self.display_window = display_window
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_finished_jobs = max_finished_jobs
+
+    def submit(
+        self, runner: Callable[..., Optional[str]], *args: Any, session: str | None = None
+    ) -> Job:
+        job = Job(uuid.uuid4().hex, session, self.display_window)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._pool.submit(self._run, job, runner, args)
+        return job
+
+    def _run(self, job: Job, runner: Callable[..., Optional[str]], args: tuple) -> None:
+        if job.cancel_requested:
+            job.finish(JOB_CANCELLED)
+            return
+        job.start()
+        try:
+            result_path = runner(job, *args)
+        except JobCancelled:
+            job.finish(JOB_CANCELLED)
+        except Exception as exc:
+            job.finish(JOB_FAILED, error=str(exc))
+        else:
+            job.finish(JOB_DONE, result_path=result_path)
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get((job_id or "").strip())
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        job.cancel_requested = True
+        return True
+
+    def _evict(self) -> None:
+        finished = [j for j in self._jobs.values() if j.status in FINISHED_STATES]
+        for job in finished[: max(len(finished) - self.max_finished_jobs, 0)]:
+            self._jobs.pop(job.id, None)
+
+    def stats(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
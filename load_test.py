@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import tracing
+from mock_backend import start_mock_server
+
+
+class FakeRequest:
+    def __init__(self, session_hash: str) -> None:
+        self.session_hash = session_hash
+
+
+def read_rss_bytes(pid: Optional[int] = None) -> int:
+    path = f"/proc/{pid or 'self'}/status"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if pid:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def read_cpu_seconds(pid: Optional[int] = None) -> float:
+    if not pid:
+        return time.process_time()
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="utf-8") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+class ResourceSampler(threading.Thread):
+    def __init__(self, pid: Optional[int] = None, interval: float = 0.2) -> None:
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.rss: List[int] = []
+        self.cpu_percent: List[float] = []
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        last_cpu = read_cpu_seconds(self.pid)
+        last_wall = time.monotonic()
+        while not self._stop_event.wait(self.interval):
+            cpu = read_cpu_seconds(self.pid)
+            wall = time.monotonic()
+            self.cpu_percent.append((cpu - last_cpu) / max(wall - last_wall, 1e-6) * 100)
+            self.rss.append(read_rss_bytes(self.pid))
+            last_cpu, last_wall = cpu, wall
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop_event.set()
+        self.join()
+        return {
+            "peak_rss_mb": round(max(self.rss, default=0) / 1048576, 1),
+            "final_rss_mb": round((self.rss[-1] if self.rss else 0) / 1048576, 1),
+            "mean_cpu_percent": round(statistics.fmean(self.cpu_percent), 1) if self.cpu_percent else 0.0,
+            "peak_cpu_percent": round(max(self.cpu_percent, default=0.0), 1),
+        }
+
+
+class EventRecorder:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.payloads: Dict[str, List[int]] = {}
+        self.errors: List[str] = []
+
+    def record(self, event: str, latency: float, payload: int) -> None:
+        with self._lock:
+            self.latencies.setdefault(event, []).append(latency)
+            self.payloads.setdefault(event, []).append(payload)
+
+    def error(self, message: str) -> None:
+        with self._lock:
+            self.errors.append(message)
+
+    def summary(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {}
+        for event, values in self.latencies.items():
+            ordered = sorted(values)
+            sizes = sorted(self.payloads[event])
+            report[event] = {
+                "count": len(ordered),
+                "latency_p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+                "latency_p95_ms": round(ordered[int(len(ordered) * 0.95) - 1 if len(ordered) > 1 else 0] * 1000, 2),
+                "latency_max_ms": round(ordered[-1] * 1000, 2),
+                "payload_p50_bytes": sizes[len(sizes) // 2],
+                "payload_max_bytes": sizes[-1],
+            }
+        return report
+
+
+def payload_size(outputs: Any) -> int:
+    if isinstance(outputs, (list, tuple)):
+        return sum(payload_size(value) for value in outputs)
+    if outputs is None:
+        return 0
+    if isinstance(outputs, str):
+        return len(outputs.encode("utf-8"))
+    return len(json.dumps(outputs, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def timed(func: Callable[..., Any], recorder: EventRecorder, event: str) -> Callable[..., Any]:
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        recorder.record(event, time.perf_counter() - started, payload_size(result))
+        return result
+
+    return wrapper
+
+
+def run_inprocess_user(
+    app: Any, recorder: EventRecorder, user: int, args: argparse.Namespace
+) -> None:
+    request = FakeRequest(f"load-user-{user}")
+    try:
+        started = time.perf_counter()
+        rows, *rest = app.handle_generate_subtopics(
+            f"压力测试主题{user}", args.subtopics, args.pairs, "load-test-token", request
+        )
+        recorder.record("generate_subtopics", time.perf_counter() - started, payload_size([rows, *rest]))
+        last = time.perf_counter()
+        for outputs in app.handle_generate_translations(rows, "load-test-token", args.length, request):
+            now = time.perf_counter()
+            recorder.record("generate_translations.yield", now - last, payload_size(outputs))
+            last = now
+    except Exception as exc:
+        recorder.error(f"user {user}: {exc}")
+
+
+def run_client_user(
+    client_factory: Callable[[], Any], recorder: EventRecorder, user: int, args: argparse.Namespace
+) -> None:
+    try:
+        client = client_factory()
+        started = time.perf_counter()
+        result = client.predict(
+            f"压力测试主题{user}", args.subtopics, args.pairs, "load-test-token",
+            api_name="/handle_generate_subtopics",
+        )
+        recorder.record("generate_subtopics", time.perf_counter() - started, payload_size(result))
+        rows = result[0]
+        job = client.submit(rows, "load-test-token", args.length, api_name="/handle_generate_translations")
+        last = time.perf_counter()
+        seen = 0
+        while not job.done() or seen < len(job.outputs()):
+            outputs = job.outputs()
+            for output in outputs[seen:]:
+                now = time.perf_counter()
+                recorder.record("generate_translations.yield", now - last, payload_size(output))
+                last = now
+            seen = len(outputs)
+            time.sleep(0.05)
+        job.result()
+    except Exception as exc:
+        recorder.error(f"user {user}: {exc}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gradio 应用并发压测（本地模拟后端）")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--subtopics", type=int, default=5)
+    parser.add_argument("--pairs", type=int, default=5, help="每个子话题翻译数量")
+    parser.add_argument("--length", type=int, default=40)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--ramp-seconds", type=float, default=0.0, help="用户启动的间隔总时长")
+    parser.add_argument("--url", help="压测已运行的 Gradio 服务（需要 gradio_client），否则进程内压测")
+    parser.add_argument("--server-pid", type=int, help="--url 模式下采样该进程的 CPU 和 RSS")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    tracing.add_trace_arguments(parser)
+    args = parser.parse_args()
+    tracing.configure_from_args(args)
+
+    recorder = EventRecorder()
+    mock_server = None
+    if args.url:
+        from gradio_client import Client
+
+        sampler = ResourceSampler(args.server_pid)
+        target: Callable[[int], None] = lambda user: run_client_user(
+            lambda: Client(args.url, verbose=False), recorder, user, args
+        )
+    else:
+        mock_server, host = start_mock_server(tokens_per_second=args.tokens_per_second)
+        os.environ["HAPPY_API_HOST"] = host
+        os.environ.setdefault("MODEL_STATS_PATH", "")
+        os.environ.setdefault("COUNT_STATS_PATH", "")
+        os.chdir(tempfile.mkdtemp(prefix="load_test_"))
+        import app
+
+        app.render_translation_table = timed(app.render_translation_table, recorder, "render_translation_table")
+        sampler = ResourceSampler()
+        target = lambda user: run_inprocess_user(app, recorder, user, args)
+
+    sampler.start()
+    started = time.monotonic()
+    threads = [threading.Thread(target=target, args=(user,)) for user in range(args.users)]
+    for thread in threads:
+        thread.start()
+        if args.ramp_seconds:
+            time.sleep(args.ramp_seconds / max(args.users, 1))
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    resources = sampler.stop()
+    if mock_server is not None:
+        mock_server.shutdown()
+
+    report = {
+        "users": args.users,
+        "wall_seconds": round(elapsed, 2),
+        "events": recorder.summary(),
+        "resources": resources,
+        "errors": recorder.errors,
+    }
+    if tracing.is_enabled():
+        report["spans"] = tracing.summarize()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    print(f"用户数: {args.users}  总耗时: {report['wall_seconds']}s  错误: {len(recorder.errors)}")
+    for event, stats in report["events"].items():
+        print(
+            f"  {event:<30} n={stats['count']:<6} p50={stats['latency_p50_ms']}ms "
+            f"p95={stats['latency_p95_ms']}ms max={stats['latency_max_ms']}ms "
+            f"payload p50={stats['payload_p50_bytes']}B max={stats['payload_max_bytes']}B"
+        )
+    print(
+        f"  RSS 峰值 {resources['peak_rss_mb']}MB  结束 {resources['final_rss_mb']}MB  "
+        f"CPU 平均 {resources['mean_cpu_percent']}%  峰值 {resources['peak_cpu_percent']}%"
+    )
+    for name, stats in report.get("spans", {}).items():
+        print(f"  span {name:<32} n={int(stats['count']):<6} total={stats['total_ms']}ms mean={stats['mean_ms']}ms")
+    for message in recorder.errors[:10]:
+        print(f"  错误: {message}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,17 @@
 import glob
 import os
 
-def merge_jsonl_files():
-    # 1. Setup paths
-    input_folder = 'out'
-    output_filename = 'merged_uyghur_translations.jsonl'
-    
-    # 2. Find all .jsonl files in the 'out' folder
-    # This creates a list of file paths like ['out/file1.jsonl', 'out/file2.jsonl', ...]
-    search_path = os.path.join(input_folder, '*.jsonl')
-    files = glob.glob(search_path)
+from compressed_io import JSONL_SUFFIXES, JsonlSink, iter_lines
+
+def merge_jsonl_files(input_folder='out', output_filename='merged_uyghur_translations.jsonl'):
+    # 1. Setup paths (defaults: 'out' -> 'merged_uyghur_translations.jsonl')
+    # An output name ending in .gz or .zst is written compressed.
+
+    # 2. Find all .jsonl files (plain, .jsonl.gz or .jsonl.zst) in the 'out' folder
+    # This creates a list of file paths like ['out/file1.jsonl', 'out/file2.jsonl.gz', ...]
+    files = []
+    for suffix in JSONL_SUFFIXES:
+        files.extend(glob.glob(os.path.join(input_folder, '*' + suffix)))
     
     # Sort them by name so they merge in chronological order (based on your timestamps)
     files.sort()
@@ -17,19 +19,16 @@ def merge_jsonl_files():
     print(f"Found {len(files)} files to merge.")
 
     # 3. Create the new merged file
-    with open(output_filename, 'w', encoding='utf-8') as outfile:
+    # Inputs are decompressed as a stream, one chunk at a time, so large files
+    # are never loaded whole. A truncated compressed tail is skipped.
+    with JsonlSink(output_filename) as outfile:
         for filename in files:
             print(f"Processing: {filename}")
             try:
-                with open(filename, 'r', encoding='utf-8') as infile:
-                    for line in infile:
-                        # Write the line to the new file
-                        outfile.write(line)
-                        
-                        # Safety check: Ensure the file ends with a newline 
-                        # so the next file doesn't start on the same line.
-                        if not line.endswith('\n'):
-                            outfile.write('\n')
+                for line in iter_lines(filename, include_partial=True):
+                    # JsonlSink makes sure every line ends with a newline
+                    # so the next file doesn't start on the same line.
+                    outfile.write_line(line)
             except Exception as e:
                 print(f"Error reading {filename}: {e}")
 
@@ -0,0 +1,220 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+from usage_ledger import estimate_tokens
+
+CHINESE_POOL = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经"
+    "十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严"
+)
+ARABIC_LETTERS = "ئابپتجچخدرزژسشغفقكگڭلمنھوۇۆۈۋېىي"
+
+COUNT_RE = re.compile(r"生成数量:\s*(\d+)")
+LENGTH_RE = re.compile(r"每条中文长度约\s*(\d+)")
+SUBTOPIC_COUNT_RE = re.compile(r"子话题数量:\s*(\d+)")
+TOPIC_RE = re.compile(r"主题:\s*(.+)")
+BACK_TRANSLATION_RE = re.compile(r"回译数量:\s*(\d+)")
+NUMBERED_LINE_RE = re.compile(r"^\d+\.\s*(.*)$", re.M)
+MAX_REMEMBERED_PAIRS = 100_000
+
+
+def fake_chinese(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice(CHINESE_POOL) for _ in range(max(length, 1))) + "。"
+
+
+def fake_uyghur(rng: random.Random, length: int) -> str:
+    words = []
+    for _ in range(max(length // 2, 1)):
+        words.append("".join(rng.choice(ARABIC_LETTERS) for _ in range(rng.randint(2, 7))))
+    return " ".join(words) + "."
+
+
+def detect_response_format(prompt: str) -> str:
+    from generate_translation import RESPONSE_FORMATS
+
+    for name, fmt in RESPONSE_FORMATS.items():
+        if fmt["instruction"] in prompt:
+            return name
+    return "json"
+
+
+def build_mock_reply(
+    prompt: str,
+    rng: random.Random,
+    memory: Dict[str, str] | None = None,
+    mistranslation_rate: float = 0.0,
+) -> str:
+    if BACK_TRANSLATION_RE.search(prompt):
+        lines = NUMBERED_LINE_RE.findall(prompt.split("句子:", 1)[-1])
+        translations = []
+        for line in lines:
+            known = (memory or {}).get(line.strip())
+            if known is None or rng.random() < mistranslation_rate:
+                known = fake_chinese(rng, max(len(line) // 2, 5))
+            translations.append(known)
+        return json.dumps({"translations": translations}, ensure_ascii=False)
+    subtopic_match = SUBTOPIC_COUNT_RE.search(prompt)
+    if subtopic_match:
+        topic_match = TOPIC_RE.search(prompt)
+        topic = topic_match.group(1).strip() if topic_match else "主题"
+        count = int(subtopic_match.group(1))
+        return json.dumps(
+            {"topics": [f"{topic}·子话题{i + 1}" for i in range(count)]},
+            ensure_ascii=False,
+        )
+    count_match = COUNT_RE.search(prompt)
+    if count_match:
+        count = int(count_match.group(1))
+        length_match = LENGTH_RE.search(prompt)
+        length = int(length_match.group(1)) if length_match else 40
+        pairs: List[Tuple[str, str]] = []
+        for _ in range(count):
+            zh_length = max(int(rng.gauss(length, length * 0.15)), 5)
+            pairs.append((fake_chinese(rng, zh_length), fake_uyghur(rng, zh_length)))
+        if memory is not None:
+            if len(memory) > MAX_REMEMBERED_PAIRS:
+                memory.clear()
+            memory.update((uyghur, chinese) for chinese, uyghur in pairs)
+        from generate_translation import RESPONSE_FORMATS
+
+        return RESPONSE_FORMATS[detect_response_format(prompt)]["render"](pairs)
+    return json.dumps({"message": "ok"}, ensure_ascii=False)
+
+
+class MockCompletionHandler(BaseHTTPRequestHandler):
+    server_version = "MockLLM/1.0"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_error(400)
+            return
+        config: Dict[str, Any] = self.server.config
+        model = str(payload.get("model", ""))
+        if model in config["failing_models"] or config["rng"].random() < config["failure_rate"]:
+            self.send_error(503, "mock upstream unavailable")
+            return
+        messages = payload.get("messages") or [{}]
+        prompt = str(messages[-1].get("content", ""))
+        with config["lock"]:
+            reply = build_mock_reply(prompt, config["rng"], config["memory"], config["mistranslation_rate"])
+        finish_reason = "stop"
+        if config["max_reply_chars"] and len(reply) > config["max_reply_chars"]:
+            reply = reply[: config["max_reply_chars"]]
+            finish_reason = "length"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        time.sleep(config["first_token_latency"])
+        chunk_chars = config["chunk_chars"]
+        tokens_per_second = config["tokens_per_second"]
+        try:
+            for start in range(0, len(reply), chunk_chars):
+                piece = reply[start:start + chunk_chars]
+                if tokens_per_second > 0:
+                    time.sleep(estimate_tokens(piece) / tokens_per_second)
+                self.write_event({"model": model, "choices": [{"index": 0, "delta": {"content": piece}}]})
+            self.write_event(
+                {
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+                    "usage": {
+                        "prompt_tokens": estimate_tokens(prompt),
+                        "completion_tokens": estimate_tokens(reply),
+                        "total_tokens": estimate_tokens(prompt) + estimate_tokens(reply),
+                    },
+                }
+            )
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def write_event(self, data: Dict[str, Any]) -> None:
+        line = "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+        self.wfile.write(line.encode("utf-8"))
+        self.wfile.flush()
+
+
+def start_mock_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    tokens_per_second: float = 400.0,
+    first_token_latency: float = 0.1,
+    chunk_chars: int = 16,
+    failure_rate: float = 0.0,
+    failing_models: Tuple[str, ...] = (),
+    max_reply_chars: int = 0,
+    mistranslation_rate: float = 0.0,
+    seed: int = 0,
+    verbose: bool = False,
+) -> Tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer((host, port), MockCompletionHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.config = {
+        "tokens_per_second": tokens_per_second,
+        "first_token_latency": first_token_latency,
+        "chunk_chars": max(chunk_chars, 1),
+        "failure_rate": failure_rate,
+        "failing_models": set(failing_models),
+        "max_reply_chars": max_reply_chars,
+        "mistranslation_rate": mistranslation_rate,
+        "memory": {},
+        "rng": random.Random(seed),
+        "lock": threading.Lock(),
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}/v1"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地模拟 LLM 流式接口（OpenAI SSE 格式）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failing-model", action="append", default=[])
+    parser.add_argument("--max-reply-chars", type=int, default=0, help="超出即截断，模拟输出上限")
+    parser.add_argument("--mistranslation-rate", type=float, default=0.0, help="回译时返回错误译文的比例")
+    args = parser.parse_args()
+    server, url = start_mock_server(
+        args.host,
+        args.port,
+        args.tokens_per_second,
+        args.first_token_latency,
+        failure_rate=args.failure_rate,
+        failing_models=tuple(args.failing_model),
+        max_reply_chars=args.max_reply_chars,
+        mistranslation_rate=args.mistranslation_rate,
+        verbose=True,
+    )
+    print(f"模拟接口已启动: {url}  (设置 HAPPY_API_HOST={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
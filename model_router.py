@@ -0,0 +1,163 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from state_store import load_json_state, save_json_state
+
+EWMA_ALPHA = 0.2
+FAILURE_THRESHOLD = 3
+BASE_COOLDOWN_SECONDS = 60.0
+MAX_COOLDOWN_SECONDS = 1800.0
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+def _ewma(previous: float | None, value: float) -> float:
+    if previous is None:
+        return value
+    return previous + EWMA_ALPHA * (value - previous)
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {
+        "requests": 0,
+        "failures": 0,
+        "success_rate": None,
+        "latency": None,
+        "pairs_per_second": None,
+        "consecutive_failures": 0,
+        "state": STATE_CLOSED,
+        "trips": 0,
+        "open_until": 0.0,
+    }
+
+
+class ModelRouter:
+    def __init__(self, stats_path: str = "") -> None:
+        self.stats_path = stats_path
+        self._lock = threading.Lock()
+        self._probing: set = set()
+        self._cost_of: Optional[Callable[[str], Optional[float]]] = None
+        loaded = load_json_state(stats_path, {})
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        if isinstance(loaded, dict):
+            for name, stats in loaded.items():
+                if isinstance(stats, dict):
+                    merged = _new_stats()
+                    merged.update(stats)
+                    self._stats[name] = merged
+
+    def _get(self, model: str) -> Dict[str, Any]:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = _new_stats()
+            self._stats[model] = stats
+        return stats
+
+    def _refresh_state(self, stats: Dict[str, Any], now: float) -> str:
+        if stats["state"] == STATE_OPEN and now >= float(stats["open_until"]):
+            stats["state"] = STATE_HALF_OPEN
+        return stats["state"]
+
+    def set_cost_model(self, cost_of: Optional[Callable[[str], Optional[float]]]) -> None:
+        with self._lock:
+            self._cost_of = cost_of
+
+    def _score(self, name: str, stats: Dict[str, Any] | None) -> float | None:
+        if not stats or stats.get("pairs_per_second") is None:
+            return None
+        success_rate = stats.get("success_rate")
+        if success_rate is None:
+            success_rate = 1.0
+        score = float(stats["pairs_per_second"]) * float(success_rate)
+        cost = self._cost_of(name) if self._cost_of is not None else None
+        return score / cost if cost else score
+
+    def order(self, candidates: List[str]) -> List[str]:
+        now = time.time()
+        with self._lock:
+            available: List[str] = []
+            blocked: List[str] = []
+            for name in candidates:
+                stats = self._stats.get(name)
+                state = self._refresh_state(stats, now) if stats else STATE_CLOSED
+                if state == STATE_OPEN or (state == STATE_HALF_OPEN and name in self._probing):
+                    blocked.append(name)
+                else:
+                    available.append(name)
+            scores = {name: self._score(name, self._stats.get(name)) for name in available}
+            known = [s for s in scores.values() if s is not None]
+            optimistic = max(known) if known else 0.0
+            position = {name: i for i, name in enumerate(candidates)}
+            available.sort(
+                key=lambda name: (
+                    -(scores[name] if scores[name] is not None else optimistic),
+                    position[name],
+                )
+            )
+            blocked.sort(key=lambda name: float(self._stats[name]["open_until"]) if name in self._stats else 0.0)
+        return available + blocked
+
+    def begin(self, model: str) -> None:
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats and self._refresh_state(stats, time.time()) == STATE_HALF_OPEN:
+                self._probing.add(model)
+
+    def abandon(self, model: str) -> None:
+        with self._lock:
+            self._probing.discard(model)
+
+    def record_success(self, model: str, latency: float) -> None:
+        with self._lock:
+            stats = self._get(model)
+            stats["requests"] += 1
+            stats["success_rate"] = _ewma(stats["success_rate"], 1.0)
+            stats["latency"] = _ewma(stats["latency"], latency)
+            stats["consecutive_failures"] = 0
+            stats["state"] = STATE_CLOSED
+            stats["trips"] = 0
+            stats["open_until"] = 0.0
+            self._probing.discard(model)
+            self._save()
+
+    def record_failure(self, model: str, latency: float) -> None:
+        now = time.time()
+        with self._lock:
+            stats = self._get(model)
+            stats["requests"] += 1
+            stats["failures"] += 1
+            stats["success_rate"] = _ewma(stats["success_rate"], 0.0)
+            stats["latency"] = _ewma(stats["latency"], latency)
+            stats["consecutive_failures"] += 1
+            was_probing = model in self._probing
+            self._probing.discard(model)
+            if was_probing or stats["consecutive_failures"] >= FAILURE_THRESHOLD:
+                stats["trips"] += 1
+                cooldown = min(
+                    BASE_COOLDOWN_SECONDS * (2 ** (stats["trips"] - 1)),
+                    MAX_COOLDOWN_SECONDS,
+                )
+                stats["state"] = STATE_OPEN
+                stats["open_until"] = now + cooldown
+            self._save()
+
+    def record_pairs(self, model: str, pairs: int, elapsed: float) -> None:
+        if elapsed <= 0:
+            return
+        with self._lock:
+            stats = self._get(model)
+            stats["pairs_per_second"] = _ewma(stats["pairs_per_second"], pairs / elapsed)
+            self._save()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def _save(self) -> None:
+        try:
+            save_json_state(self.stats_path, self._stats)
+        except OSError:
+            pass
@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
+
+from compressed_io import JsonlSink, output_path
+from corpus_manifest import write_records
+from tracing import traced
+
+OUTPUT_DIR = "out"
+
+
+@traced()
+def write_jsonl(translations: List[Dict[str, str]]) -> str:
+    fd, path = tempfile.mkstemp(prefix="uyghur_translations_", suffix=output_path(".jsonl"))
+    os.close(fd)
+    with JsonlSink(path) as sink:
+        for item in translations:
+            line = json.dumps(
+                {"chinese": item["chinese"], "uyghur": item["uyghur"]},
+                ensure_ascii=False,
+            )
+            sink.write_line((line + "\n").encode("utf-8"))
+    return path
+
+
+@traced()
+def write_output_jsonl(translations: List[Dict[str, str]], out_dir: str | None = None) -> str:
+    path = create_output_jsonl_path(out_dir)
+    write_records(path, translations, mode="w")
+    return path
+
+
+def create_output_jsonl_path(out_dir: str | None = None) -> str:
+    out_dir = out_dir or os.path.join(os.getcwd(), OUTPUT_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    filename = f"uyghur_translations_{timestamp}_{uuid.uuid4().hex}.jsonl"
+    return output_path(os.path.join(out_dir, filename))
+
+
+@traced()
+def append_output_jsonl_items(
+    path: str,
+    items: List[Dict[str, str]],
+    subtopic: str | None = None,
+    params: Dict[str, Any] | None = None,
+) -> None:
+    if not items:
+        return
+    if subtopic:
+        items = [{**item, "subtopic": subtopic} for item in items]
+    write_records(path, items, params=params)
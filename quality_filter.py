@@ -0,0 +1,155 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from script_checks import MAX_LENGTH_RATIO, MIN_LENGTH_RATIO, inspect_pair
+
+MIN_LENGTH_FACTOR = 0.4
+MAX_LENGTH_FACTOR = 2.0
+SCRIPT_REASONS = (
+    "chinese_not_han",
+    "uyghur_latin_script",
+    "uyghur_cyrillic_script",
+    "uyghur_not_arabic",
+    "uyghur_contains_han",
+)
+
+BatchFilter = Callable[[List[Dict[str, str]], Dict[str, Any]], List[Optional[str]]]
+
+
+def _profiles(batch: List[Dict[str, str]], context: Dict[str, Any]) -> List[List[str]]:
+    profiles = context.get("profiles")
+    if profiles is None:
+        profiles = [inspect_pair(item["chinese"], item["uyghur"])[0] for item in batch]
+        context["profiles"] = profiles
+    return profiles
+
+
+def script_filter(batch: List[Dict[str, str]], context: Dict[str, Any]) -> List[Optional[str]]:
+    results: List[Optional[str]] = []
+    for reasons in _profiles(batch, context):
+        results.append(next((r for r in reasons if r in SCRIPT_REASONS), None))
+    return results
+
+
+def length_ratio_filter(batch: List[Dict[str, str]], context: Dict[str, Any]) -> List[Optional[str]]:
+    results: List[Optional[str]] = []
+    for item in batch:
+        ratio = len(item["uyghur"]) / max(len(item["chinese"]), 1)
+        results.append("length_ratio" if ratio < MIN_LENGTH_RATIO or ratio > MAX_LENGTH_RATIO else None)
+    return results
+
+
+def requested_length_filter(batch: List[Dict[str, str]], context: Dict[str, Any]) -> List[Optional[str]]:
+    length = context.get("length")
+    if not length:
+        return [None] * len(batch)
+    low = length * MIN_LENGTH_FACTOR
+    high = length * MAX_LENGTH_FACTOR
+    return [
+        None if low <= len(item["chinese"]) <= high else "chinese_length"
+        for item in batch
+    ]
+
+
+def copy_filter(batch: List[Dict[str, str]], context: Dict[str, Any]) -> List[Optional[str]]:
+    results: List[Optional[str]] = []
+    for item in batch:
+        zh = "".join(item["chinese"].split())
+        ug = "".join(item["uyghur"].split())
+        results.append("copied_source" if zh == ug or (len(zh) >= 4 and zh in ug) else None)
+    return results
+
+
+DEFAULT_FILTERS: List[Tuple[str, BatchFilter]] = [
+    ("copy", copy_filter),
+    ("script", script_filter),
+    ("length_ratio", length_ratio_filter),
+    ("requested_length", requested_length_filter),
+]
+
+
+class QualityFilter:
+    def __init__(self, filters: Optional[List[Tuple[str, BatchFilter]]] = None) -> None:
+        self.filters = list(DEFAULT_FILTERS if filters is None else filters)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {
+            name: {"checked": 0, "rejected": 0, "seconds": 0.0} for name, _ in self.filters
+        }
+        self._pairs = 0
+        self._rejected = 0
+        self._reasons: Dict[str, int] = {}
+
+    def add_filter(self, name: str, batch_filter: BatchFilter) -> None:
+        with self._lock:
+            self.filters.append((name, batch_filter))
+            self._stats[name] = {"checked": 0, "rejected": 0, "seconds": 0.0}
+
+    def apply(
+        self, items: List[Dict[str, str]], length: int | None = None
+    ) -> Tuple[List[Dict[str, str]], List[Tuple[Dict[str, str], str]]]:
+        pending = list(items)
+        rejected: List[Tuple[Dict[str, str], str]] = []
+        context: Dict[str, Any] = {"length": length}
+        timings: List[Tuple[str, int, int, float]] = []
+        for name, batch_filter in self.filters:
+            if not pending:
+                break
+            started = time.perf_counter()
+            verdicts = batch_filter(pending, context)
+            elapsed = time.perf_counter() - started
+            kept: List[Dict[str, str]] = []
+            kept_profiles: List[Any] = []
+            profiles = context.get("profiles")
+            for index, (item, reason) in enumerate(zip(pending, verdicts)):
+                if reason:
+                    rejected.append((item, reason))
+                else:
+                    kept.append(item)
+                    if profiles is not None:
+                        kept_profiles.append(profiles[index])
+            if profiles is not None:
+                context["profiles"] = kept_profiles
+            timings.append((name, len(pending), len(pending) - len(kept), elapsed))
+            pending = kept
+        with self._lock:
+            for name, checked, dropped, elapsed in timings:
+                stats = self._stats[name]
+                stats["checked"] += checked
+                stats["rejected"] += dropped
+                stats["seconds"] += elapsed
+            self._pairs += len(items)
+            self._rejected += len(rejected)
+            for _, reason in rejected:
+                self._reasons[reason] = self._reasons.get(reason, 0) + 1
+        return pending, rejected
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            filters = {
+                name: {
+                    "checked": stats["checked"],
+                    "rejected": stats["rejected"],
+                    "rejection_rate": round(stats["rejected"] / stats["checked"], 4) if stats["checked"] else 0.0,
+                    "us_per_pair": round(stats["seconds"] * 1e6 / stats["checked"], 2) if stats["checked"] else 0.0,
+                }
+                for name, stats in self._stats.items()
+            }
+            return {
+                "pairs": self._pairs,
+                "rejected": self._rejected,
+                "rejection_rate": round(self._rejected / self._pairs, 4) if self._pairs else 0.0,
+                "reasons": dict(self._reasons),
+                "filters": filters,
+            }
+
+
+def format_filter_report(report: Dict[str, Any]) -> str:
+    parts = [
+        f"{name} 拒绝 {stats['rejected']}/{stats['checked']}，{stats['us_per_pair']}µs/条"
+        for name, stats in report["filters"].items()
+    ]
+    return (
+        f"质量过滤: 拒绝 {report['rejected']}/{report['pairs']} 条"
+        f"（{report['rejection_rate']:.1%}）；" + "；".join(parts)
+    )
@@ -1,45 +1,27 @@
-import json
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
+from compressed_io import output_path
+from corpus_manifest import write_records
 from generate_topic import generate_subtopics
-from generate_translation import generate_translations_stream
-from tqdm import tqdm
+from generate_translation import QUALITY_FILTER, estimate_translation_calls, generate_translations_stream
+from quality_filter import format_filter_report
+from subtopic_index import SubtopicIndex, dedup_subtopic_rows, format_dedup_report
+from topic_source import TopicSource, load_done_ids, mark_done, parse_topic_range
+from usage_ledger import LEDGER, format_usage_report, usage_scope
+from verification import format_verification_report, get_verifier
 
 TOPICS_PATH = "topics.txt"
 OUTPUT_DIR = "multiple_out3"
 PROGRESS_PATH = os.path.join(OUTPUT_DIR, "progress_topic.json")
+DONE_PATH = os.path.join(OUTPUT_DIR, "progress_done.txt")
 SUBTOPIC_COUNT = 20
 TRANSLATION_COUNT = 20
 TRANSLATION_LENGTH = 50
 # SUBTOPIC_COUNT = 5
 # TRANSLATION_COUNT = 5
 # TRANSLATION_LENGTH = 50
-
-
-def load_topics(path: str) -> List[str]:
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"找不到主题文件: {path}")
-    with open(path, "r", encoding="utf-8") as f:
-        return [line.strip() for line in f if line.strip()]
-
-
-def load_progress(path: str) -> int:
-    if not os.path.exists(path):
-        return 0
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        value = int(data.get("next_index", 0))
-        return max(value, 0)
-    except (json.JSONDecodeError, OSError, ValueError, TypeError):
-        return 0
-
-
-def save_progress(path: str, next_index: int) -> None:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump({"next_index": next_index}, f, ensure_ascii=False, indent=2)
+SUBTOPIC_INDEX = SubtopicIndex()
 
 
 def get_api_token() -> str:
@@ -49,21 +31,42 @@ def get_api_token() -> str:
     raise RuntimeError("未找到环境变量 HAPPY_API_TOKEN。")
 
 
-def write_topic_jsonl(index: int, rows: List[Dict[str, Any]]) -> str:
+def write_topic_jsonl(topic_id: str, topic: str, rows: List[Dict[str, Any]]) -> str:
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    filename = f"topic_{index:04d}.jsonl"
-    path = os.path.join(OUTPUT_DIR, filename)
-    with open(path, "w", encoding="utf-8") as f:
-        for row in rows:
-            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    filename = f"topic_{topic_id}.jsonl"
+    path = output_path(os.path.join(OUTPUT_DIR, filename))
+    params = {
+        "subtopic_count": SUBTOPIC_COUNT,
+        "translation_count": TRANSLATION_COUNT,
+        "length": TRANSLATION_LENGTH,
+    }
+    write_records(path, rows, mode="w", topic=topic, params=params)
     return path
 
 
-def process_topic(index: int, topic: str, token: str) -> str:
-    subtopic_rows = generate_subtopics(
-        topic, SUBTOPIC_COUNT, TRANSLATION_COUNT, token
+def plan_subtopics(topic: str, token: str) -> List[List[Any]]:
+    rows = generate_subtopics(topic, SUBTOPIC_COUNT, TRANSLATION_COUNT, token)
+    kept, skipped = dedup_subtopic_rows(
+        SUBTOPIC_INDEX,
+        rows,
+        topic,
+        replenish=lambda n: generate_subtopics(topic, min(n * 2, 50), TRANSLATION_COUNT, token),
+        calls_per_row=estimate_translation_calls(TRANSLATION_COUNT, TRANSLATION_LENGTH),
     )
+    for row, match in skipped:
+        print(f"跳过重复子话题: {row[0]}（与 {match.topic}/{match.text} 相似度 {match.score}）")
+    return kept
+
+
+def process_topic(topic_id: str, topic: str, token: str) -> Tuple[str, List[str], int]:
+    from tqdm import tqdm
+
+    subtopic_rows = plan_subtopics(topic, token)
+    subtopic_names = [str(row[0]).strip() for row in subtopic_rows]
     jsonl_rows: List[Dict[str, Any]] = []
+    if not subtopic_rows:
+        print(f"子话题均与已有子话题重复，跳过翻译: {topic}")
+        return "", subtopic_names, 0
 
     with tqdm(total=len(subtopic_rows), desc=f"子话题进度: {topic}", unit="topic") as bar:
         for current, total, items in generate_translations_stream(
@@ -77,35 +80,61 @@ def process_topic(index: int, topic: str, token: str) -> str:
                     {
                         "chinese": item.get("chinese", ""),
                         "uyghur": item.get("uyghur", ""),
+                        "subtopic": subtopic_name,
+                        "model": item.get("model"),
                     }
                 )
             bar.update(1)
 
-    return write_topic_jsonl(index, jsonl_rows)
+    if not jsonl_rows:
+        return "", subtopic_names, 0
+    path = write_topic_jsonl(topic_id, topic, jsonl_rows)
+    verifier = get_verifier(token)
+    if verifier is not None:
+        verifier.submit(jsonl_rows, topic)
+    return path, subtopic_names, len(jsonl_rows)
 
 
 def main() -> None:
     token = get_api_token()
-    topics = load_topics(TOPICS_PATH)
-    if not topics:
+    source = TopicSource(TOPICS_PATH)
+    if not len(source):
         print("topics.txt 为空，未生成。")
         return
 
-    start_index = load_progress(PROGRESS_PATH)
-    if start_index >= len(topics):
-        print("已处理完所有主题。")
-        return
-
-    for index in range(start_index, len(topics)):
-        topic = topics[index]
-        print(f"处理主题 {index + 1}/{len(topics)}: {topic}")
+    start, stop = parse_topic_range(os.getenv("TOPIC_RANGE"), len(source))
+    done = load_done_ids(DONE_PATH, PROGRESS_PATH, source)
+    pending = 0
+    for record in source.iter_range(start, stop):
+        if record.topic_id in done:
+            continue
+        pending += 1
+        print(f"处理主题 {record.position + 1}/{len(source)}: {record.topic}")
         try:
-            output_path = process_topic(index, topic, token)
+            with usage_scope(record.topic):
+                output_path, subtopic_names, records = process_topic(record.topic_id, record.topic, token)
         except Exception as exc:
-            print(f"主题处理失败: {topic}，错误: {exc}")
+            print(f"主题处理失败: {record.topic}，错误: {exc}")
             break
-        save_progress(PROGRESS_PATH, index + 1)
+        if not records:
+            print(f"主题未生成任何记录，未标记完成: {record.topic}")
+            SUBTOPIC_INDEX.release_topic(record.topic)
+            continue
+        mark_done(DONE_PATH, record.topic_id)
+        done.add(record.topic_id)
+        SUBTOPIC_INDEX.commit(subtopic_names)
         print(f"已保存: {output_path}")
+        print(format_dedup_report(SUBTOPIC_INDEX.stats()))
+        if QUALITY_FILTER is not None:
+            print(format_filter_report(QUALITY_FILTER.report()))
+        print(format_usage_report(LEDGER.report()))
+    if not pending:
+        print("已处理完所有主题。")
+    verifier = get_verifier(token)
+    if verifier is not None:
+        print("等待回译校验完成...")
+        verifier.close()
+        print(format_verification_report(verifier.report()))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,445 @@
+import argparse
+import json
+import os
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from compressed_io import output_path
+from corpus_manifest import get_manifest, write_records
+from generate_topic import MODEL, generate_subtopics, iter_model_fallbacks
+from generate_translation import (
+    ADAPTIVE_COUNT,
+    COUNT_CONTROLLER,
+    QUALITY_FILTER,
+    request_translation_batch,
+)
+from quality_filter import format_filter_report
+from subtopic_index import SubtopicIndex, dedup_subtopic_rows, format_dedup_report
+from topic_source import TopicSource, parse_topic_range, topic_id_for
+from tracing import add_trace_arguments, configure_from_args
+from usage_ledger import LEDGER, BudgetExceeded, format_usage_report, usage_scope
+from verification import format_verification_report, get_verifier
+
+TOPICS_PATH = "topics.txt"
+OUTPUT_DIR = "target_out"
+SUMMARY_FILENAME = "summary.json"
+REJECTS_FILENAME = "rejected.jsonl"
+TRANSLATION_COUNT = 20
+TRANSLATION_LENGTH = 50
+MAX_SUBTOPICS_PER_REQUEST = 50
+MAX_TOPIC_FAILURES = 3
+MAX_DUPLICATE_RATIO = 0.5
+
+
+def load_quotas(path: str) -> Dict[str, int]:
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"找不到配额文件: {path}")
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".json"):
+        return {str(k).strip(): int(v) for k, v in json.loads(text).items()}
+    quotas: Dict[str, int] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        topic, _, value = line.rpartition("\t")
+        quotas[topic.strip()] = int(value)
+    return quotas
+
+
+def get_api_token() -> str:
+    token = os.getenv("HAPPY_API_TOKEN")
+    if token and token.strip():
+        return token.strip()
+    raise RuntimeError("未找到环境变量 HAPPY_API_TOKEN。")
+
+
+class TopicState:
+    def __init__(self, index: int, topic: str, quota: int) -> None:
+        self.index = index
+        self.topic = topic
+        self.quota = quota
+        self.delivered = 0
+        self.inflight = 0
+        self.subtopics: Deque[List[Any]] = deque()
+        self.subtopic_pending = False
+        self.failures = 0
+        self.duplicates = 0
+        self.flagged = 0
+        self.requests = 0
+        self.disabled = False
+
+    @property
+    def need(self) -> int:
+        return max(self.quota - self.delivered - self.inflight, 0)
+
+    @property
+    def open(self) -> bool:
+        return not self.disabled and self.need > 0
+
+
+class TargetScheduler:
+    def __init__(
+        self,
+        topics: List[str],
+        target: int,
+        token: str,
+        workers: int,
+        per_topic: int,
+        quotas: Optional[Dict[str, int]] = None,
+        output_dir: str = OUTPUT_DIR,
+        translation_count: int = TRANSLATION_COUNT,
+        length: int = TRANSLATION_LENGTH,
+    ) -> None:
+        self.target = target
+        self.token = token
+        self.workers = max(workers, 1)
+        self.output_dir = output_dir
+        self.translation_count = translation_count
+        self.length = length
+        self.strict_quotas = quotas is not None
+        self.delivered = 0
+        self.inflight = 0
+        self.seen: Set[str] = set()
+        self.states: List[TopicState] = []
+        self.reserve: Deque[TopicState] = deque()
+        self.subtopic_index = SubtopicIndex()
+        self.budget_exhausted = False
+        self.verifier = get_verifier(token)
+        self.rejected: Dict[str, List[Dict[str, Any]]] = {}
+        self._assign_quotas(topics, per_topic, quotas)
+
+    def _assign_quotas(
+        self, topics: List[str], per_topic: int, quotas: Optional[Dict[str, int]]
+    ) -> None:
+        remaining = self.target
+        for index, topic in enumerate(topics):
+            if quotas is not None:
+                quota = min(max(int(quotas.get(topic, 0)), 0), remaining)
+            else:
+                quota = min(per_topic, remaining)
+            state = TopicState(index, topic, quota)
+            remaining -= quota
+            if quota > 0:
+                self.states.append(state)
+            elif quotas is None:
+                self.reserve.append(state)
+
+    def _rebalance(self, state: TopicState) -> None:
+        deficit = max(state.quota - state.delivered - state.inflight, 0)
+        state.quota = state.delivered + state.inflight
+        if deficit <= 0 or self.strict_quotas:
+            return
+        if self.reserve:
+            fresh = self.reserve.popleft()
+            fresh.quota = deficit
+            self.states.append(fresh)
+            return
+        active = [s for s in self.states if not s.disabled]
+        for position, other in enumerate(active):
+            if deficit <= 0:
+                break
+            share = -(-deficit // (len(active) - position))
+            other.quota += share
+            deficit -= share
+
+    def _global_need(self) -> int:
+        return max(self.target - self.delivered - self.inflight, 0)
+
+    def _next_work(self, busy_topics: Set[int]) -> Optional[Tuple[str, TopicState, Any]]:
+        global_need = self._global_need()
+        if global_need <= 0:
+            return None
+        candidates = sorted(
+            (s for s in self.states if s.open),
+            key=lambda s: (-(s.need / max(s.quota, 1)), s.index),
+        )
+        for state in candidates:
+            if state.subtopics:
+                row = state.subtopics[0]
+                want = min(state.need, global_need, int(row[1]))
+                model = iter_model_fallbacks(MODEL)[0]
+                count = COUNT_CONTROLLER.plan_request(model, self.length, want) if ADAPTIVE_COUNT else want
+                row[1] = int(row[1]) - count
+                if row[1] <= 0:
+                    state.subtopics.popleft()
+                return "translate", state, (row[0], count)
+            if not state.subtopic_pending and state.index not in busy_topics:
+                needed = -(-state.need // self.translation_count)
+                return "subtopics", state, min(max(needed, 1), MAX_SUBTOPICS_PER_REQUEST)
+        return None
+
+    def _run_subtopics(self, topic: str, count: int) -> List[List[Any]]:
+        with usage_scope(topic):
+            return generate_subtopics(topic, count, self.translation_count, self.token)
+
+    def _run_translate(self, topic: str, subtopic: str, count: int) -> List[Dict[str, str]]:
+        with usage_scope(topic):
+            items, _ = request_translation_batch(subtopic, count, self.length, self.token)
+        return items
+
+    def _accept(self, state: TopicState, subtopic: str, items: List[Dict[str, str]]) -> int:
+        accepted: List[Dict[str, str]] = []
+        duplicates = 0
+        room = min(state.quota - state.delivered, self.target - self.delivered)
+        for item in items:
+            if len(accepted) >= room:
+                break
+            key = "".join(item["chinese"].split())
+            if key in self.seen:
+                duplicates += 1
+                continue
+            self.seen.add(key)
+            accepted.append(item)
+        state.duplicates += duplicates
+        if items and duplicates / len(items) > MAX_DUPLICATE_RATIO:
+            state.subtopics = deque(row for row in state.subtopics if row[0] != subtopic)
+        if accepted:
+            self._append(state, subtopic, accepted)
+            self.subtopic_index.commit([subtopic])
+            if self.verifier is not None:
+                self.verifier.submit(accepted, state.topic, subtopic)
+        state.delivered += len(accepted)
+        self.delivered += len(accepted)
+        return len(accepted)
+
+    def _topic_path(self, topic: str) -> str:
+        return output_path(os.path.join(self.output_dir, f"topic_{topic_id_for(topic)}.jsonl"))
+
+    def _params(self) -> Dict[str, Any]:
+        return {"translation_count": self.translation_count, "length": self.length}
+
+    def _append(self, state: TopicState, subtopic: str, items: List[Dict[str, str]]) -> None:
+        rows = [{**item, "subtopic": subtopic} for item in items]
+        write_records(self._topic_path(state.topic), rows, topic=state.topic, params=self._params())
+
+    def _fail(self, state: TopicState) -> None:
+        state.failures += 1
+        if state.failures >= MAX_TOPIC_FAILURES:
+            state.disabled = True
+            self._rebalance(state)
+
+    def _requeue_flagged(self, bar: Any) -> int:
+        if self.verifier is None:
+            return 0
+        flagged = self.verifier.drain_flagged()
+        if not flagged:
+            return 0
+        by_topic = {s.topic: s for s in self.states}
+        dropped = 0
+        for result in flagged:
+            state = by_topic.get(result["topic"])
+            if state is None:
+                continue
+            state.flagged += 1
+            state.delivered -= 1
+            self.delivered -= 1
+            dropped += 1
+            self.rejected.setdefault(state.topic, []).append(result)
+            if state.disabled:
+                continue
+            if state.flagged > state.quota:
+                state.disabled = True
+                self._rebalance(state)
+                continue
+            if state.subtopics and state.subtopics[-1][0] == result["subtopic"]:
+                state.subtopics[-1][1] = int(state.subtopics[-1][1]) + 1
+            else:
+                state.subtopics.append([result["subtopic"], 1])
+        if dropped:
+            bar.update(-dropped)
+        return dropped
+
+    def _verification_requeued(self, bar: Any) -> bool:
+        if self.verifier is None or self.budget_exhausted:
+            return False
+        self.verifier.join()
+        return self._requeue_flagged(bar) > 0
+
+    def _drop_rejected(self) -> None:
+        if not self.rejected:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, REJECTS_FILENAME), "a", encoding="utf-8") as f:
+            for results in self.rejected.values():
+                for result in results:
+                    f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        manifest = get_manifest(self.output_dir)
+        for topic, results in self.rejected.items():
+            path = self._topic_path(topic)
+            flagged = Counter((r["chinese"], r["uyghur"]) for r in results)
+            kept: List[Dict[str, Any]] = []
+            for record in manifest.iter_records(path):
+                key = (record["chinese"], record["uyghur"])
+                if flagged[key] > 0:
+                    flagged[key] -= 1
+                    continue
+                kept.append(record)
+            write_records(path, kept, mode="w", topic=topic, params=self._params())
+        self.rejected = {}
+
+    def _stop_for_budget(self, exc: BudgetExceeded) -> None:
+        if not self.budget_exhausted:
+            print(f"{exc} 等待进行中的请求完成后退出。")
+        self.budget_exhausted = True
+
+    def run(self) -> Dict[str, Any]:
+        from tqdm import tqdm
+
+        pending: Dict[Future, Tuple[str, TopicState, Any]] = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, tqdm(
+            total=self.target, desc="目标条数", unit="pair"
+        ) as bar:
+            while self.delivered < self.target or self._verification_requeued(bar):
+                self._requeue_flagged(bar)
+                busy = {s.index for kind, s, _ in pending.values() if kind == "subtopics"}
+                while len(pending) < self.workers and not self.budget_exhausted:
+                    work = self._next_work(busy)
+                    if work is None:
+                        break
+                    kind, state, payload = work
+                    state.requests += 1
+                    if kind == "subtopics":
+                        state.subtopic_pending = True
+                        busy.add(state.index)
+                        future = pool.submit(self._run_subtopics, state.topic, payload)
+                    else:
+                        state.inflight += payload[1]
+                        self.inflight += payload[1]
+                        future = pool.submit(self._run_translate, state.topic, payload[0], payload[1])
+                    pending[future] = work
+                if not pending:
+                    if self._verification_requeued(bar):
+                        continue
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, state, payload = pending.pop(future)
+                    if kind == "subtopics":
+                        state.subtopic_pending = False
+                        try:
+                            rows = future.result()
+                        except BudgetExceeded as exc:
+                            self._stop_for_budget(exc)
+                            continue
+                        except Exception as exc:
+                            print(f"子话题生成失败: {state.topic}，错误: {exc}")
+                            self._fail(state)
+                            continue
+                        rows, _ = dedup_subtopic_rows(self.subtopic_index, rows, state.topic)
+                        if not rows:
+                            self._fail(state)
+                        state.subtopics.extend(rows)
+                        continue
+                    subtopic, count = payload
+                    state.inflight -= count
+                    self.inflight -= count
+                    try:
+                        items = future.result()
+                    except BudgetExceeded as exc:
+                        self._stop_for_budget(exc)
+                        continue
+                    except Exception as exc:
+                        print(f"翻译生成失败: {subtopic}，错误: {exc}")
+                        self._fail(state)
+                        continue
+                    accepted = self._accept(state, subtopic, items)
+                    if accepted:
+                        state.failures = 0
+                        bar.update(accepted)
+                    else:
+                        self._fail(state)
+            if self.verifier is not None:
+                self.verifier.join()
+                self._requeue_flagged(bar)
+            self._drop_rejected()
+        return self.summary()
+
+    def summary(self) -> Dict[str, Any]:
+        topics = [
+            {
+                "index": s.index,
+                "topic_id": topic_id_for(s.topic),
+                "topic": s.topic,
+                "quota": s.quota,
+                "delivered": s.delivered,
+                "duplicates": s.duplicates,
+                "flagged": s.flagged,
+                "requests": s.requests,
+                "disabled": s.disabled,
+            }
+            for s in self.states
+        ]
+        return {
+            "target": self.target,
+            "delivered": self.delivered,
+            "requests": sum(s.requests for s in self.states),
+            "duplicates": sum(s.duplicates for s in self.states),
+            "quality_filter": QUALITY_FILTER.report() if QUALITY_FILTER else None,
+            "subtopic_dedup": self.subtopic_index.stats(),
+            "budget_exhausted": self.budget_exhausted,
+            "verification": self.verifier.report() if self.verifier is not None else None,
+            "usage": LEDGER.report(include_topics=True),
+            "topics": topics,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="按目标条数生成语料，尽快达到并精确停止")
+    parser.add_argument("--target", type=int, required=True, help="目标翻译条数")
+    parser.add_argument("--topics", default=TOPICS_PATH)
+    parser.add_argument("--range", help="只使用该范围内的主题，如 0:1000")
+    parser.add_argument("--quotas", help="每个主题的配额文件（JSON 或 主题<TAB>数量）")
+    parser.add_argument("--per-topic", type=int, default=0, help="未指定配额时每个主题的条数")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--translation-count", type=int, default=TRANSLATION_COUNT, help="每个子话题最多生成的条数")
+    parser.add_argument("--length", type=int, default=TRANSLATION_LENGTH)
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+
+    if args.target <= 0:
+        raise SystemExit("目标条数必须大于 0。")
+    token = get_api_token()
+    source = TopicSource(args.topics)
+    start, stop = parse_topic_range(args.range, len(source))
+    topics = [record.topic for record in source.iter_range(start, stop)]
+    if not topics:
+        print("topics.txt 为空，未生成。")
+        return
+    quotas = load_quotas(args.quotas) if args.quotas else None
+    per_topic = args.per_topic or max(-(-args.target // len(topics)), args.translation_count)
+    scheduler = TargetScheduler(
+        topics,
+        args.target,
+        token,
+        args.workers,
+        per_topic,
+        quotas,
+        args.output_dir,
+        args.translation_count,
+        args.length,
+    )
+    summary = scheduler.run()
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary_path = os.path.join(args.output_dir, SUMMARY_FILENAME)
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    print(
+        f"完成 {summary['delivered']}/{summary['target']} 条，"
+        f"请求 {summary['requests']} 次，重复 {summary['duplicates']} 条。已保存: {summary_path}"
+    )
+    print(format_dedup_report(summary["subtopic_dedup"]))
+    if summary["quality_filter"]:
+        print(format_filter_report(summary["quality_filter"]))
+    if summary["verification"]:
+        print(format_verification_report(summary["verification"]))
+    print(format_usage_report(summary["usage"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import re
+from typing import Dict, List, Tuple
+
+HAN_RE = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+ARABIC_RE = re.compile(r"[؀-ۿݐ-ݿﭐ-﷿ﹰ-﻿]")
+LATIN_RE = re.compile(r"[A-Za-zÀ-ɏ]")
+CYRILLIC_RE = re.compile(r"[Ѐ-ӿ]")
+
+MIN_ARABIC_SHARE = 0.8
+MIN_HAN_SHARE = 0.5
+MIN_LENGTH_RATIO = 0.8
+MAX_LENGTH_RATIO = 6.0
+
+
+def script_counts(text: str) -> Dict[str, int]:
+    return {
+        "han": len(HAN_RE.findall(text)),
+        "arabic": len(ARABIC_RE.findall(text)),
+        "latin": len(LATIN_RE.findall(text)),
+        "cyrillic": len(CYRILLIC_RE.findall(text)),
+    }
+
+
+def letter_share(counts: Dict[str, int], script: str) -> float:
+    letters = sum(counts.values())
+    if not letters:
+        return 0.0
+    return counts[script] / letters
+
+
+def inspect_pair(chinese: str, uyghur: str) -> Tuple[List[str], Dict[str, int], Dict[str, int]]:
+    zh_counts = script_counts(chinese)
+    ug_counts = script_counts(uyghur)
+    if not chinese or not uyghur:
+        return ["empty"], zh_counts, ug_counts
+    reasons: List[str] = []
+    if letter_share(zh_counts, "han") < MIN_HAN_SHARE:
+        reasons.append("chinese_not_han")
+    if ug_counts["latin"] > ug_counts["arabic"]:
+        reasons.append("uyghur_latin_script")
+    elif ug_counts["cyrillic"] > ug_counts["arabic"]:
+        reasons.append("uyghur_cyrillic_script")
+    elif letter_share(ug_counts, "arabic") < MIN_ARABIC_SHARE:
+        reasons.append("uyghur_not_arabic")
+    if ug_counts["han"]:
+        reasons.append("uyghur_contains_han")
+    ratio = len(uyghur) / max(len(chinese), 1)
+    if ratio < MIN_LENGTH_RATIO or ratio > MAX_LENGTH_RATIO:
+        reasons.append("length_ratio")
+    return reasons, zh_counts, ug_counts
+
+
+def check_pair(chinese: str, uyghur: str) -> List[str]:
+    return inspect_pair(chinese, uyghur)[0]
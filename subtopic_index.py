@@ -0,0 +1,234 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+SUBTOPIC_INDEX_PATH = os.getenv("SUBTOPIC_INDEX_PATH", "subtopic_index.jsonl")
+SIMILARITY_THRESHOLD = float(os.getenv("SUBTOPIC_SIMILARITY_THRESHOLD", "0.7"))
+NGRAM_SIZE = 2
+
+PUNCT_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+class SubtopicMatch(NamedTuple):
+    text: str
+    topic: str
+    score: float
+
+
+def normalize_subtopic(text: str) -> str:
+    return PUNCT_RE.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def char_ngrams(normalized: str, size: int = NGRAM_SIZE) -> Set[str]:
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i : i + size] for i in range(len(normalized) - size + 1)}
+
+
+class SubtopicIndex:
+    def __init__(self, path: str = SUBTOPIC_INDEX_PATH, threshold: float = SIMILARITY_THRESHOLD) -> None:
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._entries: List[Optional[Tuple[str, str, Set[str]]]] = []
+        self._by_key: Dict[str, int] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._pending: Dict[str, int] = {}
+        self._claimed: Set[int] = set()
+        self._offset = 0
+        self._stats = {"checked": 0, "exact": 0, "similar": 0, "calls_avoided": 0, "replacement_calls": 0}
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path) or os.path.getsize(self.path) == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                self._offset += len(raw)
+                try:
+                    entry = json.loads(raw)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    continue
+                if isinstance(entry, dict) and entry.get("text"):
+                    self._add(str(entry["text"]), str(entry.get("topic") or ""))
+
+    def _add(self, text: str, topic: str) -> Optional[int]:
+        key = normalize_subtopic(text)
+        if not key or key in self._by_key:
+            return None
+        grams = char_ngrams(key)
+        entry_id = len(self._entries)
+        self._entries.append((text, topic, grams))
+        self._by_key[key] = entry_id
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(entry_id)
+        return entry_id
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries[entry_id]
+        if entry is None:
+            return
+        text, _, grams = entry
+        self._entries[entry_id] = None
+        self._claimed.discard(entry_id)
+        self._by_key.pop(normalize_subtopic(text), None)
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(entry_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def _find(self, key: str, own_topic: Optional[str] = None) -> Optional[SubtopicMatch]:
+        def foreign(entry_id: int) -> bool:
+            return own_topic is None or self._entries[entry_id][1] != own_topic or entry_id in self._claimed
+
+        entry_id = self._by_key.get(key)
+        if entry_id is not None and foreign(entry_id):
+            text, topic, _ = self._entries[entry_id]
+            return SubtopicMatch(text, topic, 1.0)
+        grams = char_ngrams(key)
+        if not grams:
+            return None
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for candidate in self._postings.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        best: Optional[SubtopicMatch] = None
+        for candidate, overlap in shared.items():
+            if not foreign(candidate):
+                continue
+            text, topic, candidate_grams = self._entries[candidate]
+            score = overlap / (len(grams) + len(candidate_grams) - overlap)
+            if score >= self.threshold and (best is None or score > best.score):
+                best = SubtopicMatch(text, topic, round(score, 3))
+        return best
+
+    def find(self, text: str) -> Optional[SubtopicMatch]:
+        with self._lock:
+            return self._find(normalize_subtopic(text))
+
+    def claim(self, text: str, topic: str = "") -> Optional[SubtopicMatch]:
+        key = normalize_subtopic(text)
+        with self._lock:
+            self._stats["checked"] += 1
+            self._load()
+            match = self._find(key, topic)
+            if match is not None:
+                self._stats["exact" if match.score >= 1.0 else "similar"] += 1
+                return match
+            entry_id = self._add(text, topic)
+            if entry_id is not None:
+                self._pending[key] = entry_id
+                self._claimed.add(entry_id)
+            elif key in self._by_key:
+                self._claimed.add(self._by_key[key])
+            return None
+
+    def commit(self, texts: List[str]) -> None:
+        lines: List[str] = []
+        with self._lock:
+            self._load()
+            for text in texts:
+                key = normalize_subtopic(text)
+                entry_id = self._pending.pop(key, None)
+                if entry_id is None:
+                    continue
+                stored_text, topic, _ = self._entries[entry_id]
+                lines.append(json.dumps({"text": stored_text, "topic": topic}, ensure_ascii=False) + "\n")
+            if lines and self.path:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+    def release(self, texts: List[str]) -> None:
+        with self._lock:
+            for text in texts:
+                entry_id = self._pending.pop(normalize_subtopic(text), None)
+                if entry_id is not None:
+                    self._remove(entry_id)
+
+    def release_topic(self, topic: str) -> None:
+        with self._lock:
+            for key, entry_id in list(self._pending.items()):
+                entry = self._entries[entry_id]
+                if entry is not None and entry[1] == topic:
+                    del self._pending[key]
+                    self._remove(entry_id)
+            self._claimed = {entry_id for entry_id in self._claimed if self._entries[entry_id][1] != topic}
+
+    def record_avoided(self, calls: int) -> None:
+        with self._lock:
+            self._stats["calls_avoided"] += calls
+
+    def record_replacement(self, calls: int = 1) -> None:
+        with self._lock:
+            self._stats["replacement_calls"] += calls
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["indexed"] = len(self._by_key)
+            stats["skipped"] = stats["exact"] + stats["similar"]
+            return stats
+
+
+def _claim_rows(
+    index: SubtopicIndex, rows: List[List[Any]], topic: str
+) -> Tuple[List[List[Any]], List[Tuple[List[Any], SubtopicMatch]]]:
+    kept: List[List[Any]] = []
+    skipped: List[Tuple[List[Any], SubtopicMatch]] = []
+    for row in rows:
+        if not row or not str(row[0]).strip():
+            continue
+        match = index.claim(str(row[0]).strip(), topic)
+        if match is None:
+            kept.append(row)
+        else:
+            skipped.append((row, match))
+    return kept, skipped
+
+
+def dedup_subtopic_rows(
+    index: SubtopicIndex,
+    rows: List[List[Any]],
+    topic: str,
+    replenish: Optional[Callable[[int], List[List[Any]]]] = None,
+    calls_per_row: int = 1,
+) -> Tuple[List[List[Any]], List[Tuple[List[Any], SubtopicMatch]]]:
+    kept, skipped = _claim_rows(index, rows, topic)
+    if not skipped:
+        return kept, skipped
+    index.record_avoided(len(skipped) * calls_per_row)
+    if replenish is not None:
+        index.record_replacement()
+        try:
+            extra_rows = replenish(len(skipped))
+        except (OSError, ValueError) as exc:
+            print(f"补充子话题失败: {exc}")
+            extra_rows = []
+        extra, _ = _claim_rows(index, extra_rows, topic)
+        index.release([str(row[0]).strip() for row in extra[len(skipped):]])
+        kept.extend(extra[: len(skipped)])
+    return kept, skipped
+
+
+def format_dedup_report(stats: Dict[str, Any]) -> str:
+    return (
+        f"子话题去重: 检查 {stats['checked']} 个，跳过 {stats['skipped']} 个"
+        f"（完全相同 {stats['exact']}，近似 {stats['similar']}），"
+        f"节省翻译请求约 {stats['calls_avoided']} 次，补充子话题请求 {stats['replacement_calls']} 次"
+    )
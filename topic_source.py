@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Sequence, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from state_store import load_json_state, save_json_state
+
+INDEX_RECORD = struct.Struct("<HQI8s")
+READ_BLOCK = 1 << 20
+
+
+class TopicRecord(NamedTuple):
+    position: int
+    topic_id: str
+    topic: str
+
+
+def topic_id_for(topic: str) -> str:
+    return hashlib.sha1(topic.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def _prefix_hasher(path: str, length: int) -> Any:
+    hasher = hashlib.sha1()
+    remaining = length
+    with open(path, "rb") as f:
+        while remaining > 0:
+            block = f.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+@contextmanager
+def _locked(path: str) -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as handle:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+class TopicSource:
+    def __init__(self, paths: Sequence[str] | str, index_path: str | None = None) -> None:
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        if not self.paths:
+            raise ValueError("至少需要一个主题文件。")
+        for path in self.paths:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"找不到主题文件: {path}")
+        self.index_path = index_path or self.paths[0] + ".idx"
+        self.meta_path = self.index_path + ".json"
+        self.lock_path = self.index_path + ".lock"
+        self._count = 0
+        self.refresh()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _fresh_meta(self) -> Dict[str, object]:
+        return {
+            "paths": [os.path.abspath(p) for p in self.paths],
+            "files": [{"indexed_bytes": 0, "digest": "", "partial_tail": False} for _ in self.paths],
+            "count": 0,
+        }
+
+    def refresh(self) -> int:
+        with _locked(self.lock_path):
+            return self._refresh_locked()
+
+    def _refresh_locked(self) -> int:
+        meta = load_json_state(self.meta_path, None)
+        rebuild = (
+            not isinstance(meta, dict)
+            or meta.get("paths") != [os.path.abspath(p) for p in self.paths]
+            or not os.path.exists(self.index_path)
+            or os.path.getsize(self.index_path) != int(meta.get("count", -1)) * INDEX_RECORD.size
+        )
+        hashers = []
+        if not rebuild:
+            for path, state in zip(self.paths, meta["files"]):
+                size = os.path.getsize(path)
+                indexed = int(state["indexed_bytes"])
+                if size < indexed or (state["partial_tail"] and size != indexed):
+                    rebuild = True
+                    break
+                hasher = _prefix_hasher(path, indexed)
+                if hasher.hexdigest() != state.get("digest"):
+                    rebuild = True
+                    break
+                hashers.append(hasher)
+        tmp_path = None
+        if rebuild:
+            meta = self._fresh_meta()
+            hashers = [hashlib.sha1() for _ in self.paths]
+            directory = os.path.dirname(os.path.abspath(self.index_path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".topics_", suffix=".idx", dir=directory)
+            index_file = os.fdopen(fd, "wb")
+        else:
+            index_file = open(self.index_path, "ab")
+        added = 0
+        try:
+            with index_file:
+                for file_no, (path, state) in enumerate(zip(self.paths, meta["files"])):
+                    added += self._index_file(file_no, path, state, index_file, hashers[file_no])
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            if tmp_path is not None:
+                os.replace(tmp_path, self.index_path)
+        except BaseException:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        meta["count"] = int(meta["count"]) + added
+        self._count = int(meta["count"])
+        save_json_state(self.meta_path, meta)
+        return added
+
+    def _index_file(self, file_no: int, path: str, state: Dict[str, object], index_file, hasher: Any) -> int:
+        start = int(state["indexed_bytes"])
+        size = os.path.getsize(path)
+        if size <= start:
+            state["digest"] = hasher.hexdigest()
+            return 0
+        added = 0
+        buffer = bytearray()
+        with open(path, "rb") as f:
+            f.seek(start)
+            offset = start
+            while True:
+                block = f.read(min(READ_BLOCK, size - offset - len(buffer)))
+                if not block:
+                    break
+                hasher.update(block)
+                buffer.extend(block)
+                line_start = 0
+                while True:
+                    newline = buffer.find(b"\n", line_start)
+                    if newline < 0:
+                        break
+                    added += self._write_record(index_file, file_no, offset + line_start, buffer[line_start:newline])
+                    line_start = newline + 1
+                offset += line_start
+                del buffer[:line_start]
+        state["partial_tail"] = bool(buffer.strip())
+        if buffer:
+            added += self._write_record(index_file, file_no, offset, buffer)
+        state["indexed_bytes"] = size
+        state["digest"] = hasher.hexdigest()
+        return added
+
+    def _write_record(self, index_file, file_no: int, offset: int, raw: bytes) -> int:
+        topic = bytes(raw).decode("utf-8", errors="replace").strip()
+        if not topic:
+            return 0
+        digest = bytes.fromhex(topic_id_for(topic))
+        index_file.write(INDEX_RECORD.pack(file_no, offset, len(raw), digest))
+        return 1
+
+    def _read_entries(self, start: int, stop: int) -> List[Tuple[int, int, int, bytes]]:
+        with open(self.index_path, "rb") as f:
+            f.seek(start * INDEX_RECORD.size)
+            data = f.read((stop - start) * INDEX_RECORD.size)
+        return list(INDEX_RECORD.iter_unpack(data))
+
+    def iter_range(self, start: int = 0, stop: int | None = None, batch: int = 4096) -> Iterator[TopicRecord]:
+        stop = self._count if stop is None else min(stop, self._count)
+        handles: Dict[int, object] = {}
+        try:
+            for batch_start in range(max(start, 0), stop, batch):
+                entries = self._read_entries(batch_start, min(batch_start + batch, stop))
+                for position, (file_no, offset, length, digest) in enumerate(entries, start=batch_start):
+                    handle = handles.get(file_no)
+                    if handle is None:
+                        handle = open(self.paths[file_no], "rb")
+                        handles[file_no] = handle
+                    handle.seek(offset)
+                    topic = handle.read(length).decode("utf-8", errors="replace").strip()
+                    yield TopicRecord(position, digest.hex(), topic)
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+    def get(self, position: int) -> TopicRecord:
+        if position < 0 or position >= self._count:
+            raise IndexError(position)
+        return next(self.iter_range(position, position + 1))
+
+
+def parse_topic_range(value: str | None, total: int) -> Tuple[int, int]:
+    if not value:
+        return 0, total
+    start_text, _, stop_text = value.partition(":")
+    start = int(start_text) if start_text.strip() else 0
+    stop = int(stop_text) if stop_text.strip() else total
+    return max(start, 0), min(stop, total)
+
+
+def load_done_ids(path: str, legacy_progress_path: str | None = None, source: TopicSource | None = None) -> Set[str]:
+    done: Set[str] = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            done.update(line.strip() for line in f if line.strip())
+        return done
+    if legacy_progress_path and source is not None and os.path.exists(legacy_progress_path):
+        try:
+            with open(legacy_progress_path, "r", encoding="utf-8") as f:
+                next_index = int(json.load(f).get("next_index", 0))
+        except (json.JSONDecodeError, OSError, ValueError, TypeError):
+            next_index = 0
+        done.update(record.topic_id for record in source.iter_range(0, next_index))
+    return done
+
+
+def mark_done(path: str, topic_id: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(topic_id + "\n")
+        f.flush()
+        os.fsync(f.fileno())
@@ -0,0 +1,307 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "chrome")
+TRACE_SAMPLE_HZ = float(os.getenv("TRACE_SAMPLE_HZ", "0"))
+MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "1000000"))
+TRACE_FORMATS = ("chrome", "otel")
+SERVICE_NAME = "synthetic-translation-data"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_enabled = False
+_lock = threading.Lock()
+_spans: List[Dict[str, Any]] = []
+_dropped = 0
+_next_id = 0
+_trace_id = ""
+_epoch_offset_ns = 0
+_current: contextvars.ContextVar[Optional["_Span"]] = contextvars.ContextVar("trace_span", default=None)
+_active: Dict[int, List[str]] = {}
+_output_path = ""
+_output_format = "chrome"
+_profiler: Optional["SamplingProfiler"] = None
+
+
+class _NullSpan:
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+    def set(self, **attrs: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "category", "attrs", "span_id", "parent", "start", "thread", "token")
+
+    def __init__(self, name: str, category: str, attrs: Dict[str, Any]) -> None:
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "_Span":
+        global _next_id
+        with _lock:
+            _next_id += 1
+            self.span_id = _next_id
+        parent = _current.get()
+        self.parent = parent.span_id if parent is not None else 0
+        self.thread = threading.get_ident()
+        self.token = _current.set(self)
+        _active.setdefault(self.thread, []).append(self.name)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        global _dropped
+        end = time.perf_counter_ns()
+        _current.reset(self.token)
+        stack = _active.get(self.thread)
+        if stack:
+            stack.pop()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        record = {
+            "name": self.name,
+            "category": self.category,
+            "id": self.span_id,
+            "parent": self.parent,
+            "thread": self.thread,
+            "thread_name": threading.current_thread().name,
+            "start_ns": self.start,
+            "end_ns": end,
+            "attrs": self.attrs,
+        }
+        with _lock:
+            if len(_spans) < MAX_SPANS:
+                _spans.append(record)
+            else:
+                _dropped += 1
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def span(name: str, category: str = "app", **attrs: Any) -> Any:
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, category, attrs)
+
+
+def traced(name: Optional[str] = None, category: Optional[str] = None) -> Callable[[F], F]:
+    def decorate(func: F) -> F:
+        span_name = name or func.__qualname__
+        span_category = category or func.__module__
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, span_category, {}):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+class SamplingProfiler:
+    def __init__(self, hz: float, path: str) -> None:
+        self.interval = 1.0 / hz
+        self.path = path
+        self.samples: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                frames: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.reverse()
+                spans = [f"[{name}]" for name in list(_active.get(thread_id) or ())]
+                key = ";".join(spans + frames)
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+
+def enable(path: str = "", fmt: str = "chrome", sample_hz: float = 0.0) -> None:
+    global _enabled, _trace_id, _epoch_offset_ns, _output_path, _output_format, _profiler
+    if fmt not in TRACE_FORMATS:
+        raise ValueError(f"不支持的追踪格式: {fmt}，可选: {', '.join(TRACE_FORMATS)}")
+    _trace_id = os.urandom(16).hex()
+    _epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+    _output_path = os.path.abspath(path) if path else ""
+    _output_format = fmt
+    if sample_hz > 0 and _profiler is None:
+        _profiler = SamplingProfiler(sample_hz, (_output_path or os.path.abspath("trace")) + ".folded")
+        _profiler.start()
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled, _profiler
+    _enabled = False
+    if _profiler is not None:
+        _profiler.stop()
+        _profiler = None
+
+
+def collected_spans() -> List[Dict[str, Any]]:
+    with _lock:
+        return list(_spans)
+
+
+def reset() -> None:
+    global _dropped
+    with _lock:
+        _spans.clear()
+        _dropped = 0
+
+
+def to_chrome_trace(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    pid = os.getpid()
+    events: List[Dict[str, Any]] = []
+    threads: Dict[int, str] = {}
+    for record in spans:
+        threads[record["thread"]] = record["thread_name"]
+        events.append(
+            {
+                "name": record["name"],
+                "cat": record["category"],
+                "ph": "X",
+                "ts": (record["start_ns"] + _epoch_offset_ns) / 1000,
+                "dur": (record["end_ns"] - record["start_ns"]) / 1000,
+                "pid": pid,
+                "tid": record["thread"],
+                "args": {k: _json_safe(v) for k, v in record["attrs"].items()},
+            }
+        )
+    for thread_id, name in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": name}})
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"dropped_spans": _dropped}}
+
+
+def _otel_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otel(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    otel_spans: List[Dict[str, Any]] = []
+    for record in spans:
+        attributes = [{"key": k, "value": _otel_value(v)} for k, v in record["attrs"].items()]
+        attributes.append({"key": "thread.name", "value": {"stringValue": record["thread_name"]}})
+        otel_spans.append(
+            {
+                "traceId": _trace_id,
+                "spanId": f"{record['id']:016x}",
+                "parentSpanId": f"{record['parent']:016x}" if record["parent"] else "",
+                "name": record["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(record["start_ns"] + _epoch_offset_ns),
+                "endTimeUnixNano": str(record["end_ns"] + _epoch_offset_ns),
+                "attributes": attributes,
+                "status": {"code": 2} if "error" in record["attrs"] else {},
+            }
+        )
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "tracing"}, "spans": otel_spans}],
+            }
+        ]
+    }
+
+
+def _json_safe(value: Any) -> Any:
+    return value if isinstance(value, (str, int, float, bool)) or value is None else str(value)
+
+
+def export(path: str = "", fmt: str = "") -> str:
+    path = path or _output_path or "trace.json"
+    fmt = fmt or _output_format
+    spans = collected_spans()
+    data = to_otel(spans) if fmt == "otel" else to_chrome_trace(spans)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    return path
+
+
+def summarize(spans: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Dict[str, float]]:
+    totals: Dict[str, Dict[str, float]] = {}
+    for record in collected_spans() if spans is None else spans:
+        entry = totals.setdefault(record["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        duration = (record["end_ns"] - record["start_ns"]) / 1e6
+        entry["count"] += 1
+        entry["total_ms"] += duration
+        entry["max_ms"] = max(entry["max_ms"], duration)
+    for entry in totals.values():
+        entry["total_ms"] = round(entry["total_ms"], 3)
+        entry["max_ms"] = round(entry["max_ms"], 3)
+        entry["mean_ms"] = round(entry["total_ms"] / entry["count"], 3)
+    return dict(sorted(totals.items(), key=lambda kv: -kv[1]["total_ms"]))
+
+
+def _flush_at_exit() -> None:
+    if not _enabled:
+        return
+    disable()
+    if _output_path:
+        export(_output_path)
+
+
+def add_trace_arguments(parser: Any) -> None:
+    parser.add_argument("--trace", default=TRACE_PATH, help="记录追踪并在退出时写入该文件")
+    parser.add_argument("--trace-format", default=TRACE_FORMAT, choices=TRACE_FORMATS, help="chrome 或 otel")
+    parser.add_argument("--trace-sample-hz", type=float, default=TRACE_SAMPLE_HZ, help="采样分析频率，输出 .folded 调用栈")
+
+
+def configure_from_args(args: Any) -> None:
+    if args.trace and not _enabled:
+        enable(args.trace, args.trace_format, args.trace_sample_hz)
+
+
+atexit.register(_flush_at_exit)
+
+if TRACE_PATH:
+    enable(TRACE_PATH, TRACE_FORMAT, TRACE_SAMPLE_HZ)
@@ -0,0 +1,92 @@
+import atexit
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+TRANSCRIPT_PATH = os.getenv("TRANSCRIPT_PATH", "")
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class Capture:
+    __slots__ = ("record", "_started", "_last")
+
+    def __init__(self, record: Dict[str, Any]) -> None:
+        self.record = record
+        self._started = time.monotonic()
+        self._last = self._started
+
+    def response(self, status: int) -> None:
+        now = time.monotonic()
+        self.record["status"] = status
+        self.record["ttfb_ms"] = int((now - self._started) * 1000)
+        self._last = now
+
+    def line(self, text: str) -> None:
+        now = time.monotonic()
+        self.record["events"].append([int((now - self._last) * 1000), text])
+        self._last = now
+
+    def error(self, exc: BaseException) -> None:
+        self.record["error"] = type(exc).__name__
+        response = getattr(exc, "response", None)
+        if response is not None and self.record.get("status") is None:
+            self.record["status"] = response.status_code
+
+
+class TranscriptRecorder:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._calls = itertools.count(1)
+        self._file: Optional[Any] = None
+
+    def new_call(self) -> str:
+        return f"{os.getpid()}-{next(self._calls)}"
+
+    def begin(self, call_id: str, attempt: int, prompt: str, requested: str, model: str) -> Capture:
+        return Capture(
+            {
+                "call": call_id,
+                "attempt": attempt,
+                "time": round(time.time(), 3),
+                "prompt": prompt_hash(prompt),
+                "prompt_chars": len(prompt),
+                "requested_model": requested,
+                "model": model,
+                "status": None,
+                "ttfb_ms": 0,
+                "events": [],
+            }
+        )
+
+    def finish(self, capture: Capture) -> None:
+        capture.record["total_ms"] = capture.record["ttfb_ms"] + sum(e[0] for e in capture.record["events"])
+        data = (json.dumps(capture.record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file is None:
+                import gzip
+
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = gzip.open(self.path, "ab")
+            self._file.write(data)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+RECORDER: Optional[TranscriptRecorder] = TranscriptRecorder(TRANSCRIPT_PATH) if TRANSCRIPT_PATH else None
+if RECORDER is not None:
+    atexit.register(RECORDER.close)
@@ -0,0 +1,214 @@
+import argparse
+import gzip
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from transcript_recorder import prompt_hash
+
+REPLAY_STATE_FILES = {
+    "MODEL_STATS_PATH": "model_stats.json",
+    "COUNT_STATS_PATH": "count_stats.json",
+    "SUBTOPIC_INDEX_PATH": "subtopic_index.jsonl",
+    "USAGE_PATH": "usage_stats.json",
+    "VERIFY_PATH": "verification.jsonl",
+}
+
+
+def iter_transcripts(path: str) -> Iterator[Dict[str, Any]]:
+    with gzip.open(path, "rb") as f:
+        try:
+            for raw in f:
+                try:
+                    yield json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+        except (EOFError, gzip.BadGzipFile):
+            return
+
+
+class TranscriptLibrary:
+    def __init__(self, paths: List[str], loose: bool = False) -> None:
+        self.loose = loose
+        self._lock = threading.Lock()
+        self._by_key: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = {}
+        self._prompts: Set[str] = set()
+        self._ordered: Deque[Dict[str, Any]] = deque()
+        self.stats = {"served": 0, "missing": 0}
+        for path in paths:
+            for record in iter_transcripts(path):
+                self._by_key.setdefault((record["prompt"], record["model"]), deque()).append(record)
+                self._prompts.add(record["prompt"])
+                if record.get("status") == 200:
+                    self._ordered.append(record)
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._by_key.values())
+
+    def match(self, prompt: str, model: str) -> Optional[Dict[str, Any]]:
+        key = (prompt_hash(prompt), model)
+        with self._lock:
+            queue = self._by_key.get(key)
+            if queue:
+                record = queue[0]
+                queue.rotate(-1)
+            elif key[0] in self._prompts:
+                record = {"status": 503, "ttfb_ms": 0, "events": []}
+            elif self.loose and self._ordered:
+                record = self._ordered[0]
+                self._ordered.rotate(-1)
+            else:
+                self.stats["missing"] += 1
+                return None
+            self.stats["served"] += 1
+            return record
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server_version = "ReplayLLM/1.0"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self) -> None:
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_error(400)
+            return
+        messages = payload.get("messages") or [{}]
+        prompt = str(messages[-1].get("content", ""))
+        record = self.server.library.match(prompt, str(payload.get("model", "")))
+        if record is None:
+            self.send_error(404, "no recorded transcript for this prompt")
+            return
+        speed = self.server.speed
+        self._sleep(record.get("ttfb_ms", 0), speed)
+        status = int(record.get("status") or 502)
+        if status != 200:
+            self.send_error(status, record.get("error") or "recorded upstream error")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for delay_ms, line in record["events"]:
+                self._sleep(delay_ms, speed)
+                self.wfile.write((line + "\n\n").encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    @staticmethod
+    def _sleep(delay_ms: float, speed: float) -> None:
+        if speed > 0 and delay_ms > 0:
+            time.sleep(delay_ms / 1000 / speed)
+
+
+def start_replay_server(
+    paths: List[str],
+    host: str = "127.0.0.1",
+    port: int = 0,
+    speed: float = 1.0,
+    loose: bool = False,
+    verbose: bool = False,
+) -> Tuple[ThreadingHTTPServer, str]:
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.speed = speed
+    server.library = TranscriptLibrary(paths, loose)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}/v1"
+
+
+def replay_environment(url: str, state_dir: str) -> Dict[str, str]:
+    env = {name: os.path.join(state_dir, filename) for name, filename in REPLAY_STATE_FILES.items()}
+    env.update(
+        {
+            "HAPPY_API_HOST": url,
+            "TRANSCRIPT_PATH": "",
+            "ADAPTIVE_TRANSLATION_COUNT": "0",
+            "BUDGET_USD": "0",
+        }
+    )
+    return env
+
+
+def summarize_transcripts(paths: List[str]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"attempts": 0, "calls": set(), "statuses": {}, "models": {}, "chunks": 0, "ttfb_ms": []}
+    for path in paths:
+        for record in iter_transcripts(path):
+            summary["attempts"] += 1
+            summary["calls"].add(record["call"])
+            status = str(record.get("status"))
+            summary["statuses"][status] = summary["statuses"].get(status, 0) + 1
+            summary["models"][record["model"]] = summary["models"].get(record["model"], 0) + 1
+            summary["chunks"] += len(record["events"])
+            summary["ttfb_ms"].append(record.get("ttfb_ms", 0))
+    ttfb = sorted(summary.pop("ttfb_ms"))
+    summary["calls"] = len(summary["calls"])
+    summary["ttfb_p50_ms"] = ttfb[len(ttfb) // 2] if ttfb else 0
+    summary["ttfb_max_ms"] = ttfb[-1] if ttfb else 0
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="回放或查看录制的上游 SSE 记录（TRANSCRIPT_PATH 开启录制）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay = sub.add_parser("replay", help="启动回放接口")
+    replay.add_argument("paths", nargs="+", help="录制文件 .jsonl.gz")
+    replay.add_argument("--host", default="127.0.0.1")
+    replay.add_argument("--port", type=int, default=8766)
+    replay.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示不等待")
+    replay.add_argument("--loose", action="store_true", help="提示词不匹配时按录制顺序返回成功记录")
+    replay.add_argument("--state-dir", help="回放时路由、条数、去重、用量状态的存放目录（默认临时目录）")
+    replay.add_argument("--run", help="在隔离环境中运行的客户端命令，结束后退出回放")
+    stats = sub.add_parser("stats", help="统计录制文件")
+    stats.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(summarize_transcripts(args.paths), ensure_ascii=False, indent=2))
+        return
+    server, url = start_replay_server(args.paths, args.host, args.port, args.speed, args.loose, verbose=not args.run)
+    state_dir = args.state_dir or tempfile.mkdtemp(prefix="replay_state_")
+    os.makedirs(state_dir, exist_ok=True)
+    env = replay_environment(url, state_dir)
+    print(f"回放接口已启动: {url}  记录 {len(server.library)} 条  状态目录: {state_dir}")
+    if args.run:
+        try:
+            returncode = subprocess.run(shlex.split(args.run), env={**os.environ, **env}).returncode
+        finally:
+            server.shutdown()
+            print(json.dumps(server.library.stats, ensure_ascii=False))
+        sys.exit(returncode)
+    print("客户端请使用以下环境变量，避免读写正式状态文件并固定请求条数:")
+    for name, value in env.items():
+        print(f"export {name}={shlex.quote(value)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(json.dumps(server.library.stats, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from state_store import load_json_state, save_json_state
+
+USAGE_PATH = os.getenv("USAGE_PATH", "usage_stats.json")
+MODEL_PRICES_PATH = os.getenv("MODEL_PRICES_PATH", "")
+BUDGET_USD = float(os.getenv("BUDGET_USD", "0"))
+DOWNGRADE_AT = float(os.getenv("BUDGET_DOWNGRADE_AT", "0.8"))
+DEFAULT_COMPLETION_TOKENS = 2000
+SAVE_INTERVAL_SECONDS = 5.0
+
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gemini-3-pro": (2.00, 12.00),
+    "gemini-3-flash-preview": (0.50, 3.00),
+    "gemini-3-fast": (0.50, 3.00),
+    "gemini-2.5-pro-preview-06-05": (1.25, 10.00),
+    "gemini-2.5-pro-preview-05-06": (1.25, 10.00),
+    "gemini-2.5-pro-preview-03-25": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-preview-09-2025": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+}
+
+_topic: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("usage_topic", default=None)
+
+
+class BudgetExceeded(RuntimeError):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    rest = len(text) - cjk
+    return cjk + (rest + 2) // 3
+
+
+def load_prices(path: str = MODEL_PRICES_PATH) -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES)
+    loaded = load_json_state(path, {})
+    if isinstance(loaded, dict):
+        for model, value in loaded.items():
+            if isinstance(value, dict):
+                prices[model] = (float(value.get("prompt", 0)), float(value.get("completion", 0)))
+            elif isinstance(value, (list, tuple)) and len(value) == 2:
+                prices[model] = (float(value[0]), float(value[1]))
+    return prices
+
+
+@contextmanager
+def usage_scope(topic: Optional[str]) -> Iterator[None]:
+    token = _topic.set(topic)
+    try:
+        yield
+    finally:
+        _topic.reset(token)
+
+
+def current_topic() -> Optional[str]:
+    return _topic.get()
+
+
+def _new_bucket() -> Dict[str, Any]:
+    return {"requests": 0, "estimated": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0, "pairs": 0}
+
+
+def _add(bucket: Dict[str, Any], delta: Dict[str, Any]) -> None:
+    for key, value in delta.items():
+        bucket[key] = bucket.get(key, 0) + value
+
+
+def _with_efficiency(bucket: Dict[str, Any]) -> Dict[str, Any]:
+    tokens = bucket["prompt_tokens"] + bucket["completion_tokens"]
+    report = dict(bucket)
+    report["cost_usd"] = round(bucket["cost_usd"], 6)
+    report["pairs_per_1k_tokens"] = round(bucket["pairs"] * 1000 / tokens, 3) if tokens else 0.0
+    report["cost_per_1k_pairs_usd"] = round(bucket["cost_usd"] * 1000 / bucket["pairs"], 4) if bucket["pairs"] else 0.0
+    return report
+
+
+class UsageLedger:
+    def __init__(
+        self,
+        path: str = USAGE_PATH,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+        budget_usd: float = BUDGET_USD,
+        downgrade_at: float = DOWNGRADE_AT,
+    ) -> None:
+        self.path = path
+        self.prices = prices if prices is not None else load_prices()
+        self.budget_usd = budget_usd
+        self.downgrade_at = downgrade_at
+        self.run_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self._lock = threading.Lock()
+        self._reserved = 0.0
+        self._run = _new_bucket()
+        self._run_models: Dict[str, Dict[str, Any]] = {}
+        self._max_completion: Dict[str, int] = {}
+        loaded = load_json_state(path, {})
+        self._totals: Dict[str, Any] = loaded if isinstance(loaded, dict) else {}
+        self._totals.setdefault("models", {})
+        self._totals.setdefault("topics", {})
+        self._dirty = False
+        self._last_save = 0.0
+
+    def price(self, model: str) -> Tuple[float, float]:
+        return self.prices.get(model, (0.0, 0.0))
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        prompt_price, completion_price = self.price(model)
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    def cost_per_pair(self, model: str) -> Optional[float]:
+        with self._lock:
+            stats = self._totals["models"].get(model)
+            if not stats or not stats.get("pairs"):
+                return None
+            return stats["cost_usd"] / stats["pairs"]
+
+    def plan(self, candidates: List[str]) -> List[str]:
+        if self.budget_usd <= 0:
+            return candidates
+        with self._lock:
+            spent = self._run["cost_usd"] + self._reserved
+        if spent < self.budget_usd * self.downgrade_at:
+            return candidates
+        return sorted(candidates, key=lambda model: sum(self.price(model)))
+
+    def reserve(self, model: str, prompt: str) -> Optional[float]:
+        if self.budget_usd <= 0:
+            return 0.0
+        with self._lock:
+            completion_tokens = self._max_completion.get(model, DEFAULT_COMPLETION_TOKENS)
+            estimate = self.cost(model, estimate_tokens(prompt), completion_tokens)
+            if self._run["cost_usd"] + self._reserved + estimate > self.budget_usd:
+                return None
+            self._reserved += estimate
+        return estimate
+
+    def release(self, reservation: Optional[float]) -> None:
+        if reservation:
+            with self._lock:
+                self._reserved = max(self._reserved - reservation, 0.0)
+
+    def record(
+        self,
+        model: str,
+        prompt: str,
+        response: str,
+        usage: Optional[Dict[str, Any]] = None,
+        reservation: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        estimated = not usage or "completion_tokens" not in usage
+        if estimated:
+            prompt_tokens = estimate_tokens(prompt)
+            completion_tokens = estimate_tokens(response)
+        else:
+            prompt_tokens = int(usage.get("prompt_tokens") or estimate_tokens(prompt))
+            completion_tokens = int(usage["completion_tokens"])
+        delta = {
+            "requests": 1,
+            "estimated": int(estimated),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": self.cost(model, prompt_tokens, completion_tokens),
+        }
+        self._apply(model, delta, reservation)
+        return delta
+
+    def record_pairs(self, model: str, pairs: int) -> None:
+        if pairs:
+            self._apply(model, {"pairs": pairs})
+
+    def _apply(self, model: str, delta: Dict[str, Any], reservation: Optional[float] = None) -> None:
+        topic = current_topic()
+        with self._lock:
+            if reservation:
+                self._reserved = max(self._reserved - reservation, 0.0)
+            if "completion_tokens" in delta:
+                self._max_completion[model] = max(
+                    self._max_completion.get(model, DEFAULT_COMPLETION_TOKENS), delta["completion_tokens"]
+                )
+            _add(self._run, delta)
+            _add(self._run_models.setdefault(model, _new_bucket()), delta)
+            _add(self._totals["models"].setdefault(model, _new_bucket()), delta)
+            if topic:
+                _add(self._totals["topics"].setdefault(topic, _new_bucket()), delta)
+            self._dirty = True
+            if time.monotonic() - self._last_save >= SAVE_INTERVAL_SECONDS:
+                self._save_unlocked()
+
+    def _save_unlocked(self) -> None:
+        if not self._dirty:
+            return
+        try:
+            save_json_state(self.path, self._totals)
+        except OSError:
+            return
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._save_unlocked()
+
+    def report(self, include_topics: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            report: Dict[str, Any] = {
+                "run_id": self.run_id,
+                "budget_usd": self.budget_usd,
+                "run": _with_efficiency(self._run),
+                "run_models": {m: _with_efficiency(b) for m, b in self._run_models.items()},
+                "total_models": {m: _with_efficiency(b) for m, b in self._totals["models"].items()},
+            }
+            if include_topics:
+                report["topics"] = {t: _with_efficiency(b) for t, b in self._totals["topics"].items()}
+            return report
+
+
+def format_usage_report(report: Dict[str, Any]) -> str:
+    run = report["run"]
+    line = (
+        f"用量: {run['requests']} 次请求，输入 {run['prompt_tokens']} / 输出 {run['completion_tokens']} tokens"
+        f"（估算 {run['estimated']} 次），费用 ${run['cost_usd']:.4f}，每千 token {run['pairs_per_1k_tokens']} 条"
+    )
+    if report["budget_usd"]:
+        line += f"，预算 ${report['budget_usd']:g}"
+    return line
+
+
+LEDGER = UsageLedger()
+atexit.register(LEDGER.flush)
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查看累计的 token 用量与费用")
+    parser.add_argument("--path", default=USAGE_PATH)
+    parser.add_argument("--by-topic", action="store_true")
+    args = parser.parse_args()
+    ledger = UsageLedger(args.path, budget_usd=0)
+    report = ledger.report(include_topics=args.by_topic)
+    for key in ("run_id", "budget_usd", "run", "run_models"):
+        report.pop(key)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from generate_topic import HAPPY_API_HOST, parse_json_from_text, stream_chat_completion_with_model
+from subtopic_index import normalize_subtopic
+from usage_ledger import BudgetExceeded
+
+VERIFY_ENABLED = os.getenv("VERIFY_TRANSLATIONS", "0") != "0"
+VERIFY_MODEL = os.getenv("VERIFY_MODEL", "gemini-2.5-flash-lite")
+VERIFY_PATH = os.getenv("VERIFY_PATH", "verification.jsonl")
+VERIFY_BATCH_SIZE = int(os.getenv("VERIFY_BATCH_SIZE", "40"))
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", "2"))
+VERIFY_MIN_SCORE = float(os.getenv("VERIFY_MIN_SCORE", "0.3"))
+VERIFY_LINGER_SECONDS = 2.0
+SCORE_NGRAM_SIZES = (1, 2)
+
+_STOP = object()
+
+
+def build_back_translation_prompt(uyghur: List[str]) -> str:
+    lines = "\n".join(f"{i + 1}. {' '.join(text.split())}" for i, text in enumerate(uyghur))
+    return (
+        "请将以下维吾尔语句子逐条翻译成简体中文，保持顺序和条数不变。\n"
+        f"回译数量: {len(uyghur)}\n"
+        "仅返回JSON，不要输出额外说明。\n"
+        '返回格式: {"translations": ["译文1", "译文2", "..."]}\n'
+        f"句子:\n{lines}"
+    )
+
+
+def parse_back_translations(response: str, expected: int) -> Optional[List[str]]:
+    data = parse_json_from_text(response)
+    if isinstance(data, dict):
+        data = data.get("translations")
+    if not isinstance(data, list) or len(data) != expected:
+        return None
+    return [str(text).strip() for text in data]
+
+
+def _ngram_counts(text: str, size: int) -> Counter:
+    return Counter(text[i : i + size] for i in range(len(text) - size + 1))
+
+
+def agreement_score(source: str, back_translation: str) -> float:
+    left = normalize_subtopic(source)
+    right = normalize_subtopic(back_translation)
+    if not left or not right:
+        return 0.0
+    scores: List[float] = []
+    for size in SCORE_NGRAM_SIZES:
+        a = _ngram_counts(left, size)
+        b = _ngram_counts(right, size)
+        total = sum(a.values()) + sum(b.values())
+        if total:
+            scores.append(2 * sum((a & b).values()) / total)
+    return round(sum(scores) / len(scores), 4) if scores else 0.0
+
+
+class Verifier:
+    def __init__(
+        self,
+        token: str,
+        host: str = HAPPY_API_HOST,
+        model: str = VERIFY_MODEL,
+        path: str = VERIFY_PATH,
+        batch_size: int = VERIFY_BATCH_SIZE,
+        workers: int = VERIFY_WORKERS,
+        min_score: float = VERIFY_MIN_SCORE,
+        linger_seconds: float = VERIFY_LINGER_SECONDS,
+    ) -> None:
+        self.token = token
+        self.host = host
+        self.model = model
+        self.path = path
+        self.batch_size = max(batch_size, 1)
+        self.min_score = min_score
+        self.linger_seconds = linger_seconds
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._flagged: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "verified": 0, "flagged": 0, "unverified": 0, "batches": 0, "score_sum": 0.0}
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"verifier-{i + 1}", daemon=True)
+            for i in range(max(workers, 1))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, items: List[Dict[str, Any]], topic: str = "", subtopic: str | None = None) -> None:
+        if self._closed:
+            return
+        for item in items:
+            if item.get("chinese") and item.get("uyghur"):
+                self._queue.put((item, topic, subtopic or item.get("subtopic") or ""))
+                with self._lock:
+                    self._stats["submitted"] += 1
+
+    def _next_batch(self) -> Tuple[List[Tuple[Dict[str, Any], str, str]], bool]:
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.linger_seconds
+        while len(batch) < self.batch_size:
+            try:
+                entry = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                self._queue.put(_STOP)
+                self._queue.task_done()
+                break
+            batch.append(entry)
+        return batch, False
+
+    def _run(self) -> None:
+        while True:
+            batch, stop = self._next_batch()
+            if stop:
+                self._queue.task_done()
+                return
+            try:
+                self._verify(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _back_translate(self, uyghur: List[str]) -> Optional[List[str]]:
+        prompt = build_back_translation_prompt(uyghur)
+        try:
+            response, _ = stream_chat_completion_with_model(
+                prompt, self.token, self.host, self.model, fallback=False
+            )
+        except (BudgetExceeded, OSError) as exc:
+            print(f"回译校验失败: {exc}")
+            return None
+        return parse_back_translations(response, len(uyghur))
+
+    def _verify(self, batch: List[Tuple[Dict[str, Any], str, str]]) -> None:
+        back = self._back_translate([item["uyghur"] for item, _, _ in batch])
+        results: List[Dict[str, Any]] = []
+        for index, (item, topic, subtopic) in enumerate(batch):
+            result = {
+                "chinese": item["chinese"],
+                "uyghur": item["uyghur"],
+                "topic": topic,
+                "subtopic": subtopic,
+                "model": item.get("model"),
+                "back_translation": None,
+                "score": None,
+                "flagged": False,
+            }
+            if back is not None:
+                score = agreement_score(item["chinese"], back[index])
+                result["back_translation"] = back[index]
+                result["score"] = score
+                result["flagged"] = score < self.min_score
+            results.append(result)
+        with self._lock:
+            self._stats["batches"] += 1
+            for result in results:
+                if result["score"] is None:
+                    self._stats["unverified"] += 1
+                    continue
+                self._stats["verified"] += 1
+                self._stats["score_sum"] += result["score"]
+                if result["flagged"]:
+                    self._stats["flagged"] += 1
+            self._write(results)
+        for result in results:
+            if result["flagged"]:
+                self._flagged.put(result)
+
+    def _write(self, results: List[Dict[str, Any]]) -> None:
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def drain_flagged(self) -> List[Dict[str, Any]]:
+        flagged: List[Dict[str, Any]] = []
+        while True:
+            try:
+                flagged.append(self._flagged.get_nowait())
+            except queue.Empty:
+                return flagged
+
+    def join(self) -> None:
+        self._queue.join()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        score_sum = stats.pop("score_sum")
+        stats["pending"] = stats["submitted"] - stats["verified"] - stats["unverified"]
+        stats["mean_score"] = round(score_sum / stats["verified"], 4) if stats["verified"] else None
+        stats["flag_rate"] = round(stats["flagged"] / stats["verified"], 4) if stats["verified"] else 0.0
+        stats["model"] = self.model
+        stats["min_score"] = self.min_score
+        return stats
+
+
+def format_verification_report(report: Dict[str, Any]) -> str:
+    mean = report["mean_score"]
+    return (
+        f"回译校验({report['model']}): 已校验 {report['verified']} 条，"
+        f"低于 {report['min_score']} 被标记 {report['flagged']} 条（{report['flag_rate'] * 100:.1f}%），"
+        f"未能校验 {report['unverified']} 条，待校验 {report['pending']} 条，"
+        f"平均分 {mean if mean is not None else '-'}"
+    )
+
+
+_VERIFIER: Optional[Verifier] = None
+_VERIFIER_LOCK = threading.Lock()
+
+
+def get_verifier(token: str) -> Optional[Verifier]:
+    global _VERIFIER
+    if not VERIFY_ENABLED:
+        return None
+    with _VERIFIER_LOCK:
+        if _VERIFIER is None:
+            _VERIFIER = Verifier(token)
+            atexit.register(_VERIFIER.close)
+        return _VERIFIER